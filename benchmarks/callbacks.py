@@ -0,0 +1,192 @@
+"""
+Tick latency of the callbacks of the status, pipeline and component pages,
+driven through the Dash test client against a fake tomato daemon (see
+``fakedaemon.py``). Each tick advances the clock of the emulated data, so that
+a run covers ``--hours`` of simulated data, waits for the pollers to pick it up
+and calls the callbacks refreshing every page.
+
+Reports latency percentiles and response sizes per callback, daemon calls per
+tick, and the growth of the RSS and of the buffered points, as JSON. With
+``--baseline``, the p50 and p99 latencies are compared to a previous run.
+
+Usage: python benchmarks/callbacks.py [--ticks N] [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+import psutil
+from fakedaemon import FakeDaemon
+from harness import DashClient, summary
+
+PORT = 1299
+TABS = ["pipelines", "drivers", "devices", "components", "jobs"]
+
+
+def wait_for_pollers(timeout: float = 2.0):
+    from marinara.poller import ComponentPoller, _pollers
+
+    pollers = [p for p in list(_pollers.values()) if p.is_alive()]
+    versions = [p.version for p in pollers]
+    for p in pollers:
+        p.wake()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(
+            p.version != v
+            for p, v in zip(pollers, versions)
+            if isinstance(p, ComponentPoller)
+        ):
+            break
+        time.sleep(0.002)
+
+
+def run(args) -> dict:
+    daemon = FakeDaemon(
+        args.port,
+        args.pipelines,
+        args.components,
+        args.latency,
+        args.rate,
+        args.chunk,
+        args.jobs,
+    ).start()
+    from marinara.app import app
+    from marinara.buffer import _buffers
+
+    dash = DashClient.local(app)
+    proc = psutil.Process()
+
+    status = dash.session()
+    status.values["tomato-port.data"] = args.port
+    status.values["tomato-table.page_current"] = 0
+    status.values["tomato-table.page_size"] = 50
+
+    pipelines = []
+    for pip in daemon.daemon.pips.values():
+        page = dash.session()
+        page.values["store-tomato-port.data"] = args.port
+        page.values["store-pipeline-name.data"] = pip.name
+        page.values["store-pipeline-events.data"] = 0
+        page.call("content-wrapper.children")
+        pipelines.append(page)
+
+    components = []
+    for name in daemon.daemon.cmps:
+        page = dash.session()
+        page.values["tomato-port-store.data"] = args.port
+        page.values["component-name-store.data"] = name
+        page.values["component-events-store.data"] = 0
+        page.call("component-data-graph.figure")
+        components.append(page)
+
+    wait_for_pollers()
+    samples = {}
+    step = args.hours * 3600 / args.ticks
+    rss0 = proc.memory_info().rss
+    calls0 = Counter(daemon.calls)
+    t0 = time.perf_counter()
+    for tick in range(args.ticks):
+        daemon.advance(step)
+        wait_for_pollers()
+
+        status.values["tomato-status.n_clicks"] = tick
+        calls = [(status, "store-tomato-status.data", "tomato-status.n_clicks", {})]
+        for tab in TABS:
+            calls.append(
+                (
+                    status,
+                    "tomato-table.data",
+                    "tomato-stgrp-tab.value",
+                    {"tomato-stgrp-tab.value": tab},
+                )
+            )
+        for page in pipelines:
+            page.values["store-pipeline-events.data"] += 1
+            calls.append(
+                (page, "store-pipeline-params.data", "store-pipeline-events.data", {})
+            )
+        for page in components:
+            page.values["component-events-store.data"] += 1
+            for output in (
+                "component-running-div.children",
+                "component-attrs-div.children",
+                "component-data-graph.figure",
+            ):
+                calls.append((page, output, "component-events-store.data", {}))
+
+        for page, output, triggered, values in calls:
+            page.values.update(values)
+            ret = page.call(output, triggered)
+            samples.setdefault(output, []).append(ret)
+
+    elapsed = time.perf_counter() - t0
+    calls = Counter(daemon.calls)
+    calls.subtract(calls0)
+    daemon.stop()
+    return dict(
+        config=vars(args),
+        elapsed_s=elapsed,
+        callbacks={output: summary(x) for output, x in samples.items()},
+        daemon_calls_per_tick={k: v / args.ticks for k, v in calls.items()},
+        rss_mb=dict(
+            start=rss0 / 2**20,
+            end=proc.memory_info().rss / 2**20,
+            growth=(proc.memory_info().rss - rss0) / 2**20,
+        ),
+        buffered_points=sum(b.count for b in _buffers.values()),
+    )
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> bool:
+    ok = True
+    print(f"{'callback':<36} {'p50':>8} {'base':>8} {'p99':>8} {'base':>8}")
+    for output, now in result["callbacks"].items():
+        base = baseline["callbacks"].get(output)
+        if base is None:
+            continue
+        print(
+            f"{output:<36} {now['p50_ms']:>8.2f} {base['p50_ms']:>8.2f}"
+            f" {now['p99_ms']:>8.2f} {base['p99_ms']:>8.2f}"
+        )
+        if now["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--pipelines", type=int, default=2)
+    parser.add_argument("--components", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.001, help="seconds")
+    parser.add_argument("--rate", type=float, default=1.0, help="points per second")
+    parser.add_argument("--chunk", type=int, default=60, help="points per reply")
+    parser.add_argument("--jobs", type=int, default=1000, help="in the queue")
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--hours", type=float, default=24.0, help="simulated")
+    parser.add_argument("--output", default=None, help="JSON file for the results")
+    parser.add_argument("--baseline", default=None, help="JSON file of a previous run")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="allowed p50 regression"
+    )
+    args = parser.parse_args()
+
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as out:
+            out.write(text)
+    if args.baseline is not None:
+        with open(args.baseline) as inf:
+            baseline = json.load(inf)
+        if not compare(result, baseline, args.tolerance):
+            sys.exit("p50 latency regressed beyond tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Payload size and encode time of a component graph with N points per trace, sent
+as JSON lists of numbers (via ``xr.Dataset.to_dict``, as before) or as base64
+typed arrays.
+
+Usage: python benchmarks/encoding.py [N ...]
+"""
+
+import sys
+import time
+import numpy as np
+import xarray as xr
+from plotly.io.json import to_json_plotly
+from marinara.encoding import typed_array
+
+KEYS = ["val", "max", "min"]
+
+
+def dataset(n: int) -> xr.Dataset:
+    uts = 1.7e9 + np.arange(n, dtype=np.float64)
+    return xr.Dataset(
+        data_vars={key: ("uts", np.random.rand(n)) for key in KEYS},
+        coords={"uts": uts},
+    )
+
+
+def figure_lists(ds: xr.Dataset) -> dict:
+    dd = ds.to_dict()
+    x = dd["coords"]["uts"]["data"]
+    data = [{"x": x, "y": dd["data_vars"][k]["data"], "name": k} for k in KEYS]
+    return {"data": data, "layout": {"uirevision": True}}
+
+
+def figure_typed(ds: xr.Dataset) -> dict:
+    x = typed_array(ds["uts"].values)
+    data = [{"x": x, "y": typed_array(ds[k].values), "name": k} for k in KEYS]
+    return {"data": data, "layout": {"uirevision": True}}
+
+
+def measure(func, ds: xr.Dataset, repeat: int = 5) -> tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        payload = to_json_plotly(func(ds))
+        best = min(best, time.perf_counter() - t0)
+    return best, len(payload)
+
+
+def main(sizes: list[int]):
+    print(f"{'points':>10} {'mode':>6} {'time / ms':>10} {'size / kB':>10}")
+    for n in sizes:
+        ds = dataset(n)
+        for mode, func in (("lists", figure_lists), ("typed", figure_typed)):
+            dt, size = measure(func, ds)
+            print(f"{n:>10} {mode:>6} {dt * 1e3:>10.2f} {size / 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [1_000, 10_000, 100_000, 1_000_000])
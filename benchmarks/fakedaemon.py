@@ -0,0 +1,255 @@
+"""
+Stand-in for a tomato daemon and its drivers, speaking the same ZMQ protocol,
+for benchmarking marinara without hardware. It emulates N pipelines of M
+components each, all served by one driver, with a configurable reply latency,
+data rate and chunk size of ``cmp_last_data``.
+
+The clock of the data can be advanced manually, to simulate hours of data in
+seconds, and the requests received are counted per command. A queue of ``jobs``
+is kept in a job database of tomato: all but the last :data:`QUEUED` are
+finished, pointing to an ``output`` file.
+
+Usage: python benchmarks/fakedaemon.py [--port PORT] [--pipelines N] ...
+"""
+
+import argparse
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import Counter
+import numpy as np
+import pint
+import xarray as xr
+import zmq
+from tomato.daemon import jobdb
+from tomato.models import Component, Daemon, Device, Driver, Pipeline, Reply
+from tomato.driverinterface_2_1 import Attr
+
+ATTRS = {
+    "setpoint": Attr(type=pint.Quantity, rw=True, status=True, units="ml/min"),
+    "mode": Attr(type=str, rw=True, options={"auto", "manual"}),
+    "gain": Attr(type=float, rw=True),
+}
+VARS = ("flow", "pressure", "temperature")
+STATUSES = ("c", "c", "cd", "ce")
+QUEUED = 10
+
+
+class FakeDaemon:
+    def __init__(
+        self,
+        port: int,
+        pipelines: int = 1,
+        components: int = 1,
+        latency: float = 0.0,
+        rate: float = 1.0,
+        chunk: int = 1,
+        jobs: int = 0,
+        output: str | None = None,
+    ):
+        self.port = port
+        self.latency = latency
+        self.rate = rate
+        self.chunk = chunk
+        self.calls = Counter()
+        self.offset = 0.0
+        self.context = zmq.Context()
+        self.halt = threading.Event()
+
+        self.tomato = self.context.socket(zmq.REP)
+        self.tomato.bind(f"tcp://127.0.0.1:{port}")
+        self.driver = self.context.socket(zmq.REP)
+        drvport = self.driver.bind_to_random_port("tcp://127.0.0.1")
+
+        drv = Driver(name="fake", version="2.1", port=drvport, pid=os.getpid())
+        pips, devs, cmps = {}, {}, {}
+        self.values = {}
+        for p in range(pipelines):
+            address = f"fake-addr-{p}"
+            devs[f"dev-{p}"] = Device(
+                name=f"dev-{p}",
+                driver="fake",
+                address=address,
+                channels=[str(c) for c in range(components)],
+                pollrate=1,
+            )
+            names = []
+            for c in range(components):
+                name = f"fake:({address},{c})"
+                cmps[name] = Component(
+                    name=name,
+                    driver="fake",
+                    device=f"dev-{p}",
+                    address=address,
+                    channel=str(c),
+                    role=f"role-{c}",
+                    capabilities={"measure"},
+                )
+                self.values[(address, str(c))] = {
+                    "setpoint": pint.Quantity(10.0, "ml/min"),
+                    "mode": "auto",
+                    "gain": 1.0,
+                }
+                names.append(name)
+            pips[f"pip-{p}"] = Pipeline(name=f"pip-{p}", components=names)
+        self.daemon = Daemon(
+            status="running",
+            port=port,
+            verbosity=20,
+            appdir="fake",
+            settings={},
+            pips=pips,
+            devs=devs,
+            drvs={"fake": drv},
+            cmps=cmps,
+        )
+        self.dbpath = os.path.join(tempfile.mkdtemp(prefix="fake-"), "jobs.sqlite")
+        jobdb.jobdb_setup(self.dbpath)
+        rows = []
+        for i in range(1, jobs + 1):
+            if i > jobs - QUEUED:
+                status = "r" if i == jobs - QUEUED + 1 else "q"
+            else:
+                status = STATUSES[i % len(STATUSES)]
+            finished = status in {"c", "cd", "ce"}
+            payload = dict(
+                version="2.2",
+                user=dict(identifier="fake"),
+                sample=dict(identifier=f"sample-{i}"),
+                method=[],
+            )
+            stamp = f"2024-01-01 00:00:{i % 60:02d}+00:00"
+            rows.append(
+                (
+                    pickle.dumps(payload),
+                    f"job-{i}",
+                    status,
+                    stamp,
+                    stamp if finished else None,
+                    output if finished else None,
+                )
+            )
+        conn, cur = jobdb.connect_jobdb(self.dbpath)
+        cur.executemany(
+            "INSERT INTO queue (payload, jobname, status, submitted_at, completed_at, "
+            "respath) VALUES (?, ?, ?, ?, ?, ?);",
+            rows,
+        )
+        conn.commit()
+        conn.close()
+
+    def now(self) -> float:
+        return time.time() + self.offset
+
+    def advance(self, seconds: float):
+        """Move the clock of the emulated data forward by ``seconds``."""
+        self.offset += seconds
+
+    def last_data(self, key: tuple) -> xr.Dataset:
+        uts = self.now() - np.arange(self.chunk)[::-1] / self.rate
+        data_vars = {
+            var: ("uts", np.sin(uts / (60 + i)) + i, {"units": "ml/min"})
+            for i, var in enumerate(VARS)
+        }
+        for attr, val in self.values[key].items():
+            val = val.m if isinstance(val, pint.Quantity) else val
+            data_vars[attr] = ("uts", np.full(self.chunk, val))
+        return xr.Dataset(data_vars=data_vars, coords={"uts": uts})
+
+    def on_tomato(self, msg: dict) -> Reply:
+        if msg["cmd"] == "status":
+            return Reply(success=True, msg="running", data=self.daemon)
+        elif msg["cmd"] == "pipeline":
+            params = dict(msg["params"])
+            pip = self.daemon.pips[params.pop("name")]
+            for key, val in params.items():
+                setattr(pip, key, val)
+            return Reply(success=True, msg="pipeline updated", data=pip)
+        elif msg["cmd"] == "get_jobs":
+            jobs = jobdb.get_jobs_where(msg["where"], self.dbpath)
+            return Reply(success=True, msg=f"found {len(jobs)} jobs", data=jobs)
+        return Reply(success=False, msg=f"unknown command {msg['cmd']!r}")
+
+    def on_driver(self, msg: dict) -> Reply:
+        params = msg.get("params", {})
+        key = (params.get("address"), params.get("channel"))
+        if key not in self.values:
+            return Reply(success=False, msg=f"component {key!r} not found")
+        if msg["cmd"] == "cmp_status":
+            data = {k: self.values[key][k] for k, v in ATTRS.items() if v.status}
+            data["running"] = False
+            return Reply(success=True, msg="status", data=data)
+        elif msg["cmd"] == "cmp_attrs":
+            return Reply(success=True, msg="attrs", data=ATTRS)
+        elif msg["cmd"] == "cmp_get_attr":
+            return Reply(
+                success=True, msg="attr", data=self.values[key][params["attr"]]
+            )
+        elif msg["cmd"] == "cmp_set_attr":
+            self.values[key][params["attr"]] = params["val"]
+            return Reply(success=True, msg="attr set", data=params["val"])
+        elif msg["cmd"] == "cmp_last_data":
+            return Reply(success=True, msg="data", data=self.last_data(key))
+        elif msg["cmd"] == "cmp_measure":
+            return Reply(success=True, msg="measurement started")
+        return Reply(success=False, msg=f"unknown command {msg['cmd']!r}")
+
+    def serve(self, sock: zmq.Socket, handler):
+        while not self.halt.is_set():
+            if not sock.poll(100, zmq.POLLIN):
+                continue
+            msg = sock.recv_pyobj()
+            self.calls[msg["cmd"]] += 1
+            if self.latency > 0:
+                time.sleep(self.latency)
+            sock.send_pyobj(handler(msg))
+        sock.close(linger=0)
+
+    def start(self):
+        for sock, handler in (
+            (self.tomato, self.on_tomato),
+            (self.driver, self.on_driver),
+        ):
+            threading.Thread(
+                target=self.serve, args=(sock, handler), daemon=True
+            ).start()
+        return self
+
+    def stop(self):
+        self.halt.set()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=1235)
+    parser.add_argument("--pipelines", type=int, default=1)
+    parser.add_argument("--components", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--rate", type=float, default=1.0, help="points per second")
+    parser.add_argument("--chunk", type=int, default=10, help="points per reply")
+    parser.add_argument("--jobs", type=int, default=0, help="in the queue")
+    parser.add_argument("--output", default=None, help="NetCDF file of the jobs")
+    args = parser.parse_args()
+    daemon = FakeDaemon(
+        args.port,
+        args.pipelines,
+        args.components,
+        args.latency,
+        args.rate,
+        args.chunk,
+        args.jobs,
+        args.output,
+    ).start()
+    print(f"fake tomato running on port {args.port}")
+    try:
+        while True:
+            time.sleep(10)
+            print(dict(daemon.calls))
+    except KeyboardInterrupt:
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
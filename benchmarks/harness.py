@@ -0,0 +1,144 @@
+"""
+Helpers shared by the benchmarks: calling the server-side Dash callbacks of
+marinara the way the browser does, either in-process through the Flask test
+client or over HTTP against a running instance.
+"""
+
+import json
+import time
+import numpy as np
+
+
+class DashClient:
+    """
+    Caller of Dash callbacks, built from the dependencies served to the browser.
+    Callbacks are selected by (a part of) their output, e.g. ``"content-wrapper"``,
+    and their inputs and states are taken from :attr:`values`, keyed by
+    ``"id.property"``, which is updated with the outputs of each call.
+    """
+
+    def __init__(self, get, post, deps: list | None = None):
+        self._get = get
+        self._post = post
+        self.values = {}
+        if deps is None:
+            deps = json.loads(get("/_dash-dependencies"))
+        self.deps = [dep for dep in deps if dep.get("clientside_function") is None]
+
+    def session(self):
+        """Return a client with the same transport and fresh :attr:`values`."""
+        return DashClient(self._get, self._post, self.deps)
+
+    @classmethod
+    def local(cls, app):
+        client = app.server.test_client()
+
+        def get(path):
+            return client.get(path).data
+
+        def post(path, body):
+            r = client.post(path, json=body)
+            return r.status_code, r.data
+
+        return cls(get, post)
+
+    @classmethod
+    def remote(cls, url: str, session=None, timeout: float | None = None, deps=None):
+        import requests
+
+        session = session or requests.Session()
+
+        def get(path):
+            return session.get(url + path, timeout=timeout).content
+
+        def post(path, body):
+            r = session.post(url + path, json=body, timeout=timeout)
+            return r.status_code, r.content
+
+        return cls(get, post, deps)
+
+    def find(self, output: str) -> dict:
+        for dep in self.deps:
+            if output in dep["output"]:
+                return dep
+        raise KeyError(output)
+
+    @staticmethod
+    def outputs(dep: dict) -> list[dict]:
+        key = dep["output"]
+        multi = key.startswith("..")
+        parts = key.strip(".").split("...") if multi else [key]
+        outs = []
+        for part in parts:
+            cid, prop = part.rsplit(".", 1)
+            outs.append({"id": cid, "property": prop.split("@")[0]})
+        return outs
+
+    def call(self, output: str, triggered: str | None = None) -> dict:
+        """
+        Call the callback with the given ``output``, as triggered by the
+        ``"id.property"`` in ``triggered``, and return its status, latency and
+        size of the response, and the ``"id.property"`` values it updated.
+        """
+        dep = self.find(output)
+        outs = self.outputs(dep)
+
+        def build(items):
+            return [
+                dict(
+                    id=x["id"],
+                    property=x["property"],
+                    value=self.values.get(f"{x['id']}.{x['property']}"),
+                )
+                for x in items
+            ]
+
+        first = dep["inputs"][0]
+        body = dict(
+            output=dep["output"],
+            outputs=outs if dep["output"].startswith("..") else outs[0],
+            inputs=build(dep["inputs"]),
+            state=build(dep["state"]),
+            changedPropIds=[triggered or f"{first['id']}.{first['property']}"],
+        )
+        t0 = time.perf_counter()
+        status, data = self._post("/_dash-update-component", body)
+        dt = time.perf_counter() - t0
+        updated = self.update(json.loads(data)) if status == 200 else []
+        return dict(status=status, seconds=dt, bytes=len(data), updated=updated)
+
+    def update(self, reply: dict) -> list[str]:
+        updated = []
+        for section in ("response", "sideUpdate"):
+            for cid, props in reply.get(section, {}).items():
+                for prop, val in props.items():
+                    key = f"{cid}.{prop}"
+                    self.values[key] = patch(self.values.get(key), val)
+                    updated.append(key)
+        return updated
+
+
+def patch(old, new):
+    """Apply a serialized :class:`dash.Patch` of top-level keys to ``old``."""
+    if not isinstance(new, dict) or "__dash_patch_update" not in new:
+        return new
+    old = dict(old or {})
+    for op in new["operations"]:
+        if op["operation"] == "Assign" and len(op["location"]) == 1:
+            old[op["location"][0]] = op["params"]["value"]
+        elif op["operation"] == "Delete" and len(op["location"]) == 1:
+            old.pop(op["location"][0], None)
+    return old
+
+
+def summary(samples: list[dict]) -> dict:
+    """Latency percentiles in ms, mean response size and error count of calls."""
+    dt = np.array([x["seconds"] for x in samples]) * 1e3
+    return dict(
+        count=len(samples),
+        errors=sum(x["status"] not in {200, 204} for x in samples),
+        p50_ms=float(np.percentile(dt, 50)),
+        p90_ms=float(np.percentile(dt, 90)),
+        p99_ms=float(np.percentile(dt, 99)),
+        mean_bytes=float(np.mean([x["bytes"] for x in samples])),
+    )
@@ -0,0 +1,81 @@
+"""
+Latency and memory of reading windows of a large job output file, as done by
+the job page. A synthetic NetCDF file of ``--points`` points per variable is
+written, unless ``--path`` points to an existing one, and windows of decreasing
+width are read from it at the resolution of a graph.
+
+Usage: python benchmarks/jobdata.py [--points N] [--path FILE] [--group ROLE]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import psutil
+import xarray as xr
+from marinara import jobdata
+
+WINDOWS = [None, 86400.0, 3600.0, 60.0]
+
+
+def write(path: str, points: int, nvars: int, rate: float):
+    """Write a synthetic job output file with a single ``fake`` group."""
+    uts = 1.7e9 + np.arange(points) / rate
+    data_vars = {
+        f"var-{i}": ("uts", np.sin(uts / (600 + i)) + 0.01 * np.random.rand(points))
+        for i in range(nvars)
+    }
+    ds = xr.Dataset(data_vars, coords={"uts": uts}, attrs={"role": "fake"})
+    xr.DataTree.from_dict({"fake": ds}).to_netcdf(path, engine="h5netcdf")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default=None, help="of an existing output file")
+    parser.add_argument("--group", default="fake")
+    parser.add_argument("--points", type=int, default=20_000_000)
+    parser.add_argument("--vars", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=10.0, help="points per second")
+    parser.add_argument("--buckets", type=int, default=1000)
+    args = parser.parse_args()
+
+    path = args.path
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "job.nc")
+        write(path, args.points, args.vars, args.rate)
+    proc = psutil.Process()
+    rss0 = proc.memory_info().rss
+
+    t0 = time.perf_counter()
+    with jobdata.open_group(path, args.group) as ds:
+        results = dict(
+            file_mb=os.path.getsize(path) / 2**20,
+            points=ds.sizes["uts"],
+            open_s=time.perf_counter() - t0,
+            windows=[],
+        )
+        first = ds["uts"].variable[0].values.item()
+        last = ds["uts"].variable[-1].values.item()
+    for width in WINDOWS:
+        if width is None:
+            x0, x1 = None, None
+        else:
+            x0 = first + (last - first - width) / 2
+            x1 = x0 + width
+        t0 = time.perf_counter()
+        _, traces = jobdata.read_window(path, args.group, None, x0, x1, args.buckets)
+        results["windows"].append(
+            dict(
+                seconds=width,
+                read_s=time.perf_counter() - t0,
+                points=sum(t["x"].size for t in traces),
+            )
+        )
+    results["rss_growth_mb"] = (proc.memory_info().rss - rss0) / 2**20
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
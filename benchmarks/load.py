@@ -0,0 +1,330 @@
+"""
+Load test of a running marinara instance with K concurrent browser sessions,
+stepping K up until the instance falls over. Each session replays the traffic
+of one page: the status page, a pipeline page or a component page, cycling
+between them. Like the browser, every session refreshes its page on each tick
+of the ``dcc.Interval`` and, on the pipeline and component pages, holds an event
+stream open, if the server accepts it, and refreshes on each event.
+
+Unless ``--url`` is passed, marinara is started with ``waitress`` against a
+local fake tomato daemon (see ``fakedaemon.py``). Unless ``--tomato`` is
+passed, the fake daemon is started on :data:`PORT`.
+
+Reports, per K, the throughput, the p50 and p99 latency of the callbacks, the
+errors and timeouts, and the saturation of the worker threads, as JSON. The
+saturation is the time spent in callbacks by the server, taken from its
+``/metrics``, plus the time the event streams were held, divided by the
+available thread time; ``streams`` counts the streams held at the end of the
+step. A step is ``overloaded`` if a session cannot load its page, marinara
+cannot reply to ``/metrics``, any call fails, or the p99 latency exceeds the
+refresh interval.
+
+Usage: python benchmarks/load.py [--sessions 1,2,4,...] [--duration S] [--url URL]
+"""
+
+import argparse
+import json
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import requests
+from fakedaemon import FakeDaemon
+from harness import DashClient, summary
+from marinara.stream import HEARTBEAT, RETRY, stream_url
+
+PORT = 1298
+HTTP = 8098
+PAGES = ["status", "pipeline", "component"]
+
+
+class Session(threading.Thread):
+    """One browser session of the ``page`` showing the pipeline or component ``name``."""
+
+    def __init__(self, args, deps: list, page: str, name: str | None, halt):
+        super().__init__(daemon=True)
+        self.args = args
+        self.page = page
+        self.name = name
+        self.halt = halt
+        self.http = requests.Session()
+        self.dash = DashClient.remote(
+            args.url, self.http, timeout=args.timeout, deps=deps
+        )
+        self.event = threading.Event()
+        self.samples = []
+        self.started = False
+        self.streaming = False
+
+    def setup(self):
+        values = self.dash.values
+        if self.page == "status":
+            values["tomato-port.data"] = self.args.tomato
+            values["tomato-stgrp-tab.value"] = "pipelines"
+            values["tomato-table.page_current"] = 0
+            values["tomato-table.page_size"] = 50
+            values["tomato-status.n_clicks"] = 0
+        elif self.page == "pipeline":
+            values["store-tomato-port.data"] = self.args.tomato
+            values["store-pipeline-name.data"] = self.name
+            values["store-pipeline-events.data"] = 0
+            values["interval-pipeline-content.n_intervals"] = 0
+            self.dash.call("content-wrapper.children")
+        else:
+            values["tomato-port-store.data"] = self.args.tomato
+            values["component-name-store.data"] = self.name
+            values["component-events-store.data"] = 0
+            values["component-interval.n_intervals"] = 0
+            self.dash.call("component-data-graph.figure")
+
+    def refresh(self, trigger: str):
+        values = self.dash.values
+        if self.page == "status":
+            values["tomato-status.n_clicks"] += 1
+            self.sample("store-tomato-status.data", "tomato-status.n_clicks")
+            self.sample("tomato-table.data", "store-tomato-status.data")
+        elif self.page == "pipeline":
+            key = {
+                "interval": "interval-pipeline-content.n_intervals",
+                "event": "store-pipeline-events.data",
+            }[trigger]
+            values[key] += 1
+            ret = self.sample("store-pipeline-params.data", key)
+            if "store-pipeline-params.data" in ret["updated"]:
+                self.sample("pipeline-input-jobid.value", "store-pipeline-params.data")
+        else:
+            key = {
+                "interval": "component-interval.n_intervals",
+                "event": "component-events-store.data",
+            }[trigger]
+            values[key] += 1
+            for output in (
+                "component-running-div.children",
+                "component-attrs-div.children",
+                "component-data-graph.figure",
+            ):
+                self.sample(output, key)
+
+    def sample(self, output: str, triggered: str) -> dict:
+        t0 = time.perf_counter()
+        try:
+            ret = self.dash.call(output, triggered)
+        except requests.RequestException:
+            ret = dict(status=0, seconds=time.perf_counter() - t0, bytes=0, updated=[])
+        self.samples.append(ret)
+        return ret
+
+    def listen(self):
+        if self.page == "pipeline":
+            path = stream_url(self.args.tomato, [None])
+        else:
+            path = stream_url(self.args.tomato, [self.name])
+        # like the browser, retry a stream refused by the server after RETRY s
+        while not self.halt.is_set():
+            try:
+                with self.http.get(
+                    self.args.url + path, stream=True, timeout=None
+                ) as r:
+                    self.streaming = r.status_code == 200
+                    for line in r.iter_lines() if self.streaming else []:
+                        if self.halt.is_set():
+                            break
+                        if line.startswith(b"data: ") and line != b"data: ":
+                            self.event.set()
+            except requests.RequestException:
+                pass
+            self.streaming = False
+            self.halt.wait(RETRY)
+
+    def run(self):
+        try:
+            self.setup()
+        except requests.RequestException:
+            return
+        self.started = True
+        self.samples.clear()
+        if self.page != "status" and self.args.streams:
+            threading.Thread(target=self.listen, daemon=True).start()
+        due = time.monotonic() + random.uniform(0, self.args.interval)
+        while not self.halt.is_set():
+            if self.event.wait(max(0.0, due - time.monotonic())):
+                self.event.clear()
+                self.refresh("event")
+            else:
+                due += self.args.interval
+                self.refresh("interval")
+        self.http.close()
+
+
+def busy_seconds(url: str) -> float | None:
+    """
+    Sum of the time spent in callbacks, from the ``/metrics`` of marinara, or
+    ``None`` if marinara has no thread left to reply.
+    """
+    try:
+        text = requests.get(url + "/metrics", timeout=10).text
+    except requests.RequestException:
+        return None
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line.startswith("marinara_callback_seconds_sum")
+    )
+
+
+def discover(url: str, deps: list, port: int) -> tuple[list, list]:
+    """Names of the pipelines and components of the daemon, via the status page."""
+    dash = DashClient.remote(url, timeout=10, deps=deps)
+    dash.values["tomato-port.data"] = port
+    dash.values["tomato-table.page_size"] = 10_000
+    names = []
+    for tab in ("pipelines", "components"):
+        dash.values["tomato-stgrp-tab.value"] = tab
+        dash.call("tomato-table.data", "tomato-stgrp-tab.value")
+        rows = dash.values["tomato-table.data"]
+        names.append([re.match(r"\[(.*)\]\(", row["name"])[1] for row in rows])
+    return names[0], names[1]
+
+
+def step(args, deps: list, pips: list, cmps: list, k: int) -> dict:
+    halt = threading.Event()
+    sessions = []
+    for i in range(k):
+        page = PAGES[i % len(PAGES)]
+        name = {"status": None, "pipeline": pips, "component": cmps}[page]
+        if name is not None:
+            name = name[(i // len(PAGES)) % len(name)]
+        sessions.append(Session(args, deps, page, name, halt))
+    for session in sessions:
+        session.start()
+
+    time.sleep(args.warmup)
+    busy0 = busy_seconds(args.url)
+    for session in sessions:
+        session.samples.clear()
+    t0 = time.perf_counter()
+    time.sleep(args.duration)
+    elapsed = time.perf_counter() - t0
+    samples = [x for session in sessions for x in list(session.samples)]
+    streams = sum(session.streaming for session in sessions)
+    busy1 = busy_seconds(args.url)
+    halt.set()
+    deadline = time.monotonic() + args.timeout
+    for session in sessions:
+        session.join(max(0.0, deadline - time.monotonic()))
+
+    started = [s for s in sessions if s.started]
+    ret = dict(
+        sessions=k,
+        started=len(started),
+        streams=streams,
+        calls=len(samples),
+        throughput=len(samples) / elapsed,
+        timeouts=sum(x["status"] == 0 for x in samples),
+        saturation=None,
+    )
+    if busy0 is not None and busy1 is not None:
+        busy = busy1 - busy0 + streams * elapsed
+        ret["saturation"] = busy / (args.threads * elapsed)
+    if samples:
+        ret.update(summary(samples))
+    ret["overloaded"] = (
+        len(started) < k
+        or ret["saturation"] is None
+        or ret.get("errors", 0) > 0
+        or ret.get("p99_ms", 0) > args.interval * 1e3
+    )
+    return ret
+
+
+def serve(args) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "marinara.app", "--host", "127.0.0.1"]
+    cmd += ["--port", str(HTTP), "--threads", str(args.threads)]
+    if args.max_streams is not None:
+        cmd += ["--streams", str(args.max_streams)]
+    proc = subprocess.Popen(cmd, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            requests.get(args.url + "/_dash-dependencies", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    sys.exit("marinara did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None, help="of a running marinara")
+    parser.add_argument("--tomato", type=int, default=None, help="port of tomato")
+    parser.add_argument("--threads", type=int, default=32, help="of marinara")
+    parser.add_argument("--sessions", default="1,2,4,8,16,32,64")
+    parser.add_argument("--duration", type=float, default=30.0, help="per step")
+    parser.add_argument("--warmup", type=float, default=2.0, help="per step")
+    parser.add_argument("--interval", type=float, default=10.0, help="of the pages")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per call")
+    parser.add_argument("--no-streams", dest="streams", action="store_false")
+    parser.add_argument("--max-streams", type=int, default=None, help="of marinara")
+    parser.add_argument("--pipelines", type=int, default=2)
+    parser.add_argument("--components", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds")
+    parser.add_argument("--rate", type=float, default=1.0, help="points per second")
+    parser.add_argument("--chunk", type=int, default=10, help="points per reply")
+    parser.add_argument("--output", default=None, help="JSON file for the results")
+    args = parser.parse_args()
+
+    daemon = None
+    if args.tomato is None:
+        args.tomato = PORT
+        daemon = FakeDaemon(
+            PORT, args.pipelines, args.components, args.latency, args.rate, args.chunk
+        ).start()
+    proc = None
+    if args.url is None:
+        args.url = f"http://127.0.0.1:{HTTP}"
+        proc = serve(args)
+
+    try:
+        deps = DashClient.remote(args.url, timeout=10).deps
+        pips, cmps = discover(args.url, deps, args.tomato)
+        results = []
+        for k in map(int, args.sessions.split(",")):
+            ret = step(args, deps, pips, cmps, k)
+            results.append(ret)
+            saturation = (
+                "-" if ret["saturation"] is None else f"{ret['saturation']:.2f}"
+            )
+            print(
+                f"K={k:<4} {ret['throughput']:>8.1f} calls/s"
+                f"  p50 {ret.get('p50_ms', 0):>8.1f} ms"
+                f"  p99 {ret.get('p99_ms', 0):>8.1f} ms"
+                f"  errors {ret.get('errors', 0):>4}"
+                f"  started {ret['started']:>4}"
+                f"  streams {ret['streams']:>4}"
+                f"  saturation {saturation}"
+                + ("  overloaded" if ret["overloaded"] else ""),
+                file=sys.stderr,
+            )
+            if args.streams:
+                # let the server notice the closed streams before the next step
+                time.sleep(HEARTBEAT + 1)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if daemon is not None:
+            daemon.stop()
+
+    text = json.dumps(dict(config=vars(args), steps=results), indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as out:
+            out.write(text)
+
+
+if __name__ == "__main__":
+    main()
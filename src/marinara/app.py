@@ -1,9 +1,53 @@
+import argparse
+import logging
+import os
 import dash
 from dash import html, dcc
+from marinara import metrics, profiling, stream
+
+THREADS = 32
 
 app = dash.Dash(__name__, use_pages=True, suppress_callback_exceptions=True)
 app.layout = html.Div(dash.page_container)
+app.server.register_blueprint(stream.bp)
+metrics.instrument(app)
+profiling.instrument(app)
+
+
+def run():
+    """
+    Serve marinara with ``waitress``, or with the Flask development server if
+    ``--debug`` is passed.
+
+    All requests are handled by the threads of a single process, so that the
+    pollers, caches and circuit breakers are shared. Every open event stream
+    occupies one of the ``--threads``, so that at most ``--streams`` are served
+    at a time, by default ``MARINARA_STREAMS`` or, if unset, a quarter of the
+    threads.
+    """
+    parser = argparse.ArgumentParser(prog="marinara")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--threads", type=int, default=THREADS)
+    parser.add_argument(
+        "--streams", type=int, default=os.environ.get("MARINARA_STREAMS")
+    )
+    parser.add_argument("--debug", action="store_true", default=False)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    if args.streams is None:
+        args.streams = max(1, args.threads // 4)
+    elif not 0 < args.streams < args.threads:
+        parser.error("--streams must be at least 1 and below --threads")
+    stream.limit(args.streams)
+    if args.debug:
+        app.run(debug=True, host=args.host, port=args.port)
+    else:
+        from waitress import serve
+
+        serve(app.server, host=args.host, port=args.port, threads=args.threads)
+
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0")
-    # app.run(debug=True)
+    run()
@@ -0,0 +1,311 @@
+// Display-sync callbacks of the pipeline page, run in the browser.
+
+// Period in ms of the fallback interval of a page while its event stream is
+// open, and while it is refused or closed, as the poll of the server.
+const STREAMING = 10000;
+const POLLING = 2000;
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    marinara: {
+        // Python str() of the values held in the stores. Values reach the store
+        // as JSON, so floats with an integral value arrive as integers.
+        pystr: function (value) {
+            const marinara = window.dash_clientside.marinara;
+            if (typeof value === "string") {
+                return value;
+            } else if (Array.isArray(value)) {
+                return "[" + value.map(marinara.pyrepr).join(", ") + "]";
+            } else if (value !== null && typeof value === "object") {
+                const items = Object.entries(value).map(
+                    ([k, v]) => marinara.pyrepr(k) + ": " + marinara.pyrepr(v),
+                );
+                return "{" + items.join(", ") + "}";
+            } else if (value === true) {
+                return "True";
+            } else if (value === false) {
+                return "False";
+            } else if (value === null || value === undefined) {
+                return "None";
+            } else if (typeof value === "number" && !Number.isInteger(value)) {
+                // repr() of floats switches to exponents below 1e-4, with at
+                // least two exponent digits
+                if (value !== 0 && Math.abs(value) < 1e-4) {
+                    return value.toExponential().replace(/e([+-])(\d)$/, "e$10$2");
+                }
+            }
+            return String(value);
+        },
+
+        // Python repr() of the values held in the stores.
+        pyrepr: function (value) {
+            if (typeof value !== "string") {
+                return window.dash_clientside.marinara.pystr(value);
+            }
+            const quote = value.includes("'") && !value.includes('"') ? '"' : "'";
+            const escaped = value
+                .replace(/\\/g, "\\\\")
+                .replace(/\n/g, "\\n")
+                .replace(/\r/g, "\\r")
+                .replace(/\t/g, "\\t");
+            return quote + (quote === "'" ? escaped.replace(/'/g, "\\'") : escaped) + quote;
+        },
+
+        // Python truth value of a value held in the stores.
+        pybool: function (value) {
+            if (Array.isArray(value)) {
+                return value.length > 0;
+            } else if (value !== null && typeof value === "object") {
+                return Object.keys(value).length > 0;
+            }
+            return Boolean(value);
+        },
+
+        // Python == of two values held in the stores, where True == 1.
+        pyeq: function (a, b) {
+            const marinara = window.dash_clientside.marinara;
+            const scalar = (x) => typeof x === "number" || typeof x === "boolean";
+            if (scalar(a) && scalar(b)) {
+                return Number(a) === Number(b);
+            } else if (Array.isArray(a) && Array.isArray(b)) {
+                return a.length === b.length && a.every((x, i) => marinara.pyeq(x, b[i]));
+            } else if (
+                a !== null && b !== null && typeof a === "object" && typeof b === "object"
+                && !Array.isArray(a) && !Array.isArray(b)
+            ) {
+                const keys = Object.keys(a);
+                return keys.length === Object.keys(b).length
+                    && keys.every((k) => k in b && marinara.pyeq(a[k], b[k]));
+            }
+            return a === b;
+        },
+
+        // Python round(value, 3) of floats: the exact binary value is rounded,
+        // with ties to even.
+        round3: function (value) {
+            if (typeof value !== "number" || !Number.isFinite(value)) {
+                return value;
+            } else if (Number.isInteger(value)) {
+                return value;
+            }
+            // toFixed() rounds ties away from zero; a tie, i.e. an odd 2000 * value,
+            // is exactly value = j / 16 with an odd j
+            const y = value * 16;
+            if (Number.isInteger(y) && y % 2 !== 0) {
+                const down = value.toFixed(4).slice(0, -1);
+                if (Number(down.slice(-1)) % 2 === 0) {
+                    return Number(down);
+                }
+            }
+            return Number(value.toFixed(3));
+        },
+
+        components_update_attr_display: function (avals, value, id) {
+            const marinara = window.dash_clientside.marinara;
+            const [cname, key] = id.index.split("/");
+            const newval = marinara.round3(avals[cname][key]);
+            if (marinara.pyeq(newval, value)) {
+                return window.dash_clientside.no_update;
+            }
+            return newval;
+        },
+
+        components_disable_attr_running: function (running, id, rw) {
+            const marinara = window.dash_clientside.marinara;
+            const [cname, key] = id.index.split("/");
+            if (!(cname in running)) {
+                // no status of the component yet
+                return window.dash_clientside.no_update;
+            } else if (marinara.pybool(running[cname])) {
+                return true;
+            }
+            return !marinara.pybool(rw[cname][key]);
+        },
+
+        components_update_param_display: function (data, value, id) {
+            if (!(id.index in data)) {
+                return window.dash_clientside.no_update;
+            }
+            const newval = window.dash_clientside.marinara.pystr(data[id.index]);
+            if (value === newval) {
+                return window.dash_clientside.no_update;
+            }
+            return newval;
+        },
+
+        components_update_data_display: function (data, value, id) {
+            const marinara = window.dash_clientside.marinara;
+            const [cname, key] = id.index.split("/");
+            if (data === null || data[cname] === undefined || !(key in data[cname])) {
+                return window.dash_clientside.no_update;
+            } else if (marinara.pyeq(value, data[cname][key])) {
+                return window.dash_clientside.no_update;
+            }
+            return marinara.round3(data[cname][key]);
+        },
+
+        update_stale_display: function (stale, value, id) {
+            const newval = stale[id.index] || "";
+            if (value === newval) {
+                return window.dash_clientside.no_update;
+            }
+            return newval;
+        },
+
+        // Subscribe to the server-sent events at url, writing a counter into the
+        // data of the store target on every change. The subscription is closed
+        // once the user navigates away from the page, and retried every 30 s if
+        // refused. Without an open stream, the dcc.Interval with the id interval
+        // fires every POLLING ms instead of every STREAMING ms.
+        subscribe: function (url, target, interval) {
+            const sources = window.marinara_sources || {};
+            window.marinara_sources = sources;
+            if (sources[target] !== undefined) {
+                sources[target].close();
+                delete sources[target];
+            }
+            if (!url || typeof EventSource === "undefined") {
+                return window.dash_clientside.no_update;
+            }
+            const pathname = window.location.pathname;
+            const source = new EventSource(url);
+            const alive = function () {
+                if (window.location.pathname !== pathname) {
+                    source.close();
+                    delete sources[target];
+                    return false;
+                }
+                return true;
+            };
+            source.onmessage = function () {
+                if (alive()) {
+                    // counted here, as the server restarts counting on reconnect
+                    window.marinara_events = (window.marinara_events || 0) + 1;
+                    window.dash_clientside.set_props(target, {data: window.marinara_events});
+                }
+            };
+            source.addEventListener("ping", alive);
+            const fallback = function (period) {
+                if (interval && sources[target] === source && alive()) {
+                    window.dash_clientside.set_props(interval, {interval: period});
+                }
+            };
+            source.onopen = function () {
+                fallback(STREAMING);
+            };
+            // a stream refused by the server is not reopened by the browser: the
+            // interval of the page keeps it updated until the retry
+            source.onerror = function () {
+                fallback(POLLING);
+                if (source.readyState !== EventSource.CLOSED || !alive()) {
+                    return;
+                }
+                setTimeout(function () {
+                    if (sources[target] === source && alive()) {
+                        const marinara = window.dash_clientside.marinara;
+                        marinara.subscribe(url, target, interval);
+                    }
+                }, 30000);
+            };
+            sources[target] = source;
+            return window.dash_clientside.no_update;
+        },
+
+        // Subscribe to the event stream at url only for the components among names
+        // whose cards are in or near the viewport, and not at all while the page
+        // is hidden. The visible components are written into the store visible,
+        // and the fallback interval is disabled while the page is hidden.
+        watch: function (url, names, target, visible, interval) {
+            const marinara = window.dash_clientside.marinara;
+            const previous = window.marinara_watch;
+            if (previous !== undefined) {
+                previous.stop();
+            }
+            if (!url || !names) {
+                return window.dash_clientside.no_update;
+            }
+            const pathname = window.location.pathname;
+            const shown = new Set();
+            let current = null;
+            let timer = null;
+            const update = function () {
+                timer = null;
+                if (window.location.pathname !== pathname) {
+                    stop();
+                    return;
+                }
+                const cmps = document.hidden ? [] : names.filter((n) => shown.has(n));
+                const key = document.hidden ? null : cmps.join("\n");
+                if (key === current) {
+                    return;
+                }
+                current = key;
+                let full = null;
+                if (!document.hidden) {
+                    const u = new URL(url, window.location.origin);
+                    cmps.forEach((n) => u.searchParams.append("name", n));
+                    full = u.pathname + u.search;
+                }
+                marinara.subscribe(full, target, interval);
+                window.dash_clientside.set_props(visible, {data: cmps});
+                window.dash_clientside.set_props(interval, {disabled: document.hidden});
+            };
+            const schedule = function () {
+                if (timer === null) {
+                    timer = setTimeout(update, 250);
+                }
+            };
+            const observer = new IntersectionObserver(
+                function (entries) {
+                    entries.forEach(function (entry) {
+                        const name = entry.target.id.slice("component-".length);
+                        if (entry.isIntersecting) {
+                            shown.add(name);
+                        } else {
+                            shown.delete(name);
+                        }
+                    });
+                    schedule();
+                },
+                {rootMargin: "200px"},
+            );
+            // the cards may not have been rendered yet
+            let pending = names.slice();
+            const attach = function (tries) {
+                pending = pending.filter(function (name) {
+                    const el = document.getElementById("component-" + name);
+                    if (el !== null) {
+                        observer.observe(el);
+                    }
+                    return el === null;
+                });
+                if (pending.length > 0 && tries > 0) {
+                    setTimeout(() => attach(tries - 1), 100);
+                }
+            };
+            const stop = function () {
+                observer.disconnect();
+                document.removeEventListener("visibilitychange", schedule);
+                if (timer !== null) {
+                    clearTimeout(timer);
+                }
+                marinara.subscribe(null, target, interval);
+                delete window.marinara_watch;
+            };
+            document.addEventListener("visibilitychange", schedule);
+            window.marinara_watch = {stop: stop};
+            attach(50);
+            schedule();
+            return window.dash_clientside.no_update;
+        },
+
+        // Width in pixels of the element with the given id, so that the
+        // server downsamples data to the resolution of the screen.
+        width: function (id) {
+            const el = document.getElementById(id);
+            if (el === null || el.offsetWidth === 0) {
+                return window.dash_clientside.no_update;
+            }
+            return el.offsetWidth;
+        },
+    },
+});
@@ -0,0 +1,26 @@
+import os
+import tempfile
+import dash
+
+CACHE_DIR = os.environ.get(
+    "MARINARA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "marinara")
+)
+
+try:
+    import diskcache
+except ImportError:
+    manager = None
+else:
+    manager = dash.DiskcacheManager(diskcache.Cache(os.path.join(CACHE_DIR, "jobs")))
+
+
+def background(**kwargs) -> dict:
+    """
+    Return the keyword arguments of :func:`dash.callback` running a callback in
+    a background process, with the ``running`` and ``cancel`` options in
+    ``kwargs``. If ``diskcache`` is not installed, only ``running`` is kept and
+    the callback runs in the server as usual.
+    """
+    if manager is None:
+        return {k: v for k, v in kwargs.items() if k == "running"}
+    return dict(background=True, manager=manager, **kwargs)
@@ -0,0 +1,109 @@
+import threading
+import os
+import bisect
+import numpy as np
+import xarray as xr
+
+CAPACITY = int(os.environ.get("MARINARA_BUFFER_CAPACITY", 100_000))
+RETENTION = float(os.environ.get("MARINARA_BUFFER_RETENTION", 24 * 3600))
+
+
+class RingBuffer:
+    """
+    Bounded, NumPy-backed store of the time-series of a single component.
+
+    Points are indexed by ``uts``; at most ``capacity`` points spanning at most
+    ``retention`` seconds are kept. The running :attr:`total` of points ever
+    appended acts as a cursor for readers interested only in new points.
+    """
+
+    def __init__(self, capacity: int = CAPACITY, retention: float = RETENTION):
+        self.capacity = capacity
+        self.retention = retention
+        self.uts = np.empty(capacity, dtype=np.float64)
+        self.vars: dict[str, np.ndarray] = {}
+        self.head = 0
+        self.count = 0
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def _index(self, n: int) -> np.ndarray:
+        return (self.head - n + np.arange(n)) % self.capacity
+
+    def _var(self, key: str, dtype: np.dtype) -> np.ndarray:
+        if key not in self.vars:
+            if dtype.kind in "biuf":
+                self.vars[key] = np.full(self.capacity, np.nan, dtype=np.float64)
+            else:
+                self.vars[key] = np.full(self.capacity, None, dtype=object)
+        return self.vars[key]
+
+    def extend(self, ds: xr.Dataset) -> int:
+        """Append the points in ``ds`` newer than the last stored one."""
+        if ds is None or "uts" not in ds.coords:
+            return 0
+        uts = np.asarray(ds["uts"].values, dtype=np.float64)
+        with self.lock:
+            if self.count > 0:
+                sel = np.flatnonzero(uts > self.uts[(self.head - 1) % self.capacity])
+            else:
+                sel = np.arange(uts.size)
+            sel = sel[-self.capacity :]
+            n = sel.size
+            if n == 0:
+                return 0
+            idx = (self.head + np.arange(n)) % self.capacity
+            self.uts[idx] = uts[sel]
+            for key, arr in self.vars.items():
+                if key not in ds.data_vars:
+                    arr[idx] = np.nan if arr.dtype.kind == "f" else None
+            for key, var in ds.data_vars.items():
+                if var.dims == ("uts",):
+                    self._var(key, var.dtype)[idx] = var.values[sel]
+            self.head = (self.head + n) % self.capacity
+            self.count = min(self.count + n, self.capacity)
+            self.total += n
+            self._expire()
+        return n
+
+    def _expire(self):
+        start = (self.head - self.count) % self.capacity
+        cutoff = self.uts[(self.head - 1) % self.capacity] - self.retention
+        if self.uts[start] >= cutoff:
+            return
+        drop = bisect.bisect_left(
+            range(self.count),
+            cutoff,
+            key=lambda i: self.uts[(start + i) % self.capacity],
+        )
+        self.count -= drop
+
+    def since(self, cursor: int = 0) -> tuple[int, dict[str, np.ndarray]]:
+        """
+        Return the new cursor and the points appended after ``cursor``, as a
+        :class:`dict` of ``uts`` and all data variables.
+        """
+        with self.lock:
+            n = min(self.total - cursor, self.count)
+            idx = self._index(n)
+            data = {"uts": self.uts[idx]}
+            for key, arr in self.vars.items():
+                data[key] = arr[idx]
+            return self.total, data
+
+    def oldest(self) -> int:
+        """Return the cursor of the oldest retained point."""
+        with self.lock:
+            return self.total - self.count
+
+
+_buffers: dict[tuple[int, str], RingBuffer] = {}
+_lock = threading.Lock()
+
+
+def get_buffer(port: int, name: str) -> RingBuffer:
+    key = (int(port), name)
+    with _lock:
+        if key not in _buffers:
+            _buffers[key] = RingBuffer()
+        return _buffers[key]
@@ -0,0 +1,45 @@
+import threading
+import logging
+from tomato.models import Reply
+from marinara import client
+
+logger = logging.getLogger(__name__)
+
+
+class AttrsCache:
+    """
+    Cache of the attribute metadata (type, units, rw, options, ...) of components.
+
+    Entries are keyed by ``(port, name, version)``, where ``version`` is the version
+    of the driver of the component, so that an upgraded driver is queried again.
+    Only successful replies are cached.
+    """
+
+    def __init__(self):
+        self._cache: dict[tuple[int, str, str], Reply] = {}
+        self._lock = threading.Lock()
+
+    def get(self, port: int, name: str, version: str) -> Reply:
+        key = (int(port), name, version)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        ret = client.attrs(port=port, name=name)
+        if ret.success:
+            with self._lock:
+                self._cache[key] = ret
+        return ret
+
+    def invalidate(self, port: int | None = None, name: str | None = None):
+        """Drop all entries matching ``port`` and ``name``; ``None`` matches all."""
+        with self._lock:
+            for key in list(self._cache):
+                if port is not None and key[0] != int(port):
+                    continue
+                if name is not None and key[1] != name:
+                    continue
+                logger.debug("invalidating attrs of %r on port %d", key[1], key[0])
+                del self._cache[key]
+
+
+attrs_cache = AttrsCache()
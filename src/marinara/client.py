@@ -0,0 +1,516 @@
+import threading
+import logging
+import os
+import pickle
+import time
+import pint
+import zmq
+from concurrent.futures import Future
+from typing import Any, Callable
+from tomato import tomato
+from tomato.models import Reply, Component, Daemon, Driver, Job
+from marinara import metrics
+
+logger = logging.getLogger(__name__)
+
+CTXT = zmq.Context()
+TOUT = 1000
+DRIVER_TOUT = 3000
+RETRIES = 1
+FAILURES = 3
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+FINISHED = {"c", "cd", "ce"}
+TTL = float(os.environ.get("MARINARA_CACHE_TTL", 1.0))
+kwargs = dict(timeout=TOUT, context=CTXT)
+
+STGRPS = {
+    "pipelines": "pips",
+    "drivers": "drvs",
+    "devices": "devs",
+    "components": "cmps",
+}
+
+
+_units = threading.Lock()
+_units_loaded = False
+
+
+def _load_units():
+    """
+    Load the unit registry of pint, once. pint loads it lazily, which is not
+    thread-safe, so it is loaded before the first reply is unpickled, as replies
+    may contain quantities and are unpickled by several threads.
+    """
+    global _units_loaded
+    if _units_loaded:
+        return
+    with _units:
+        if not _units_loaded:
+            pint.get_application_registry().parse_units("")
+            _units_loaded = True
+
+
+class SocketPool:
+    """
+    Pool of long-lived ``REQ`` sockets, keyed by the port they connect to.
+
+    A socket is checked out for the duration of a single request, so that the pool
+    can be shared by concurrent threads. If no reply arrives within the timeout,
+    the socket is closed and the request is resent on a fresh one, up to
+    ``retries`` times (the "lazy pirate" pattern).
+    """
+
+    def __init__(self, context: zmq.Context):
+        self.context = context
+        self._idle: dict[int, list[zmq.Socket]] = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, port: int) -> zmq.Socket:
+        with self._lock:
+            idle = self._idle.get(port)
+            if idle:
+                return idle.pop()
+        sock = self.context.socket(zmq.REQ)
+        sock.connect(f"tcp://127.0.0.1:{port}")
+        return sock
+
+    def _release(self, port: int, sock: zmq.Socket):
+        with self._lock:
+            self._idle.setdefault(port, []).append(sock)
+
+    def request(
+        self,
+        port: int,
+        msg: dict,
+        timeout: int = TOUT,
+        retries: int = RETRIES,
+        labels: dict | None = None,
+    ) -> Any | None:
+        """
+        Send ``msg`` to ``port`` and return the reply, or ``None`` on timeout. The
+        ``labels`` of the request metrics default to the ``port`` and command.
+        """
+        if labels is None:
+            labels = dict(port=port, component="", op=msg["cmd"])
+        for attempt in range(retries + 1):
+            t0 = time.perf_counter()
+            sock = self._acquire(port)
+            sock.send_pyobj(msg)
+            if sock.poll(timeout, zmq.POLLIN):
+                buf = sock.recv()
+                self._release(port, sock)
+                metrics.daemon_seconds.observe(time.perf_counter() - t0, **labels)
+                metrics.daemon_bytes.observe(len(buf), **labels)
+                _load_units()
+                return pickle.loads(buf)
+            logger.warning(
+                "no reply from port %d to %r, attempt %d", port, msg["cmd"], attempt
+            )
+            metrics.daemon_timeouts.inc(**labels)
+            sock.close(linger=0)
+        return None
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for sock in idle:
+                    sock.close(linger=0)
+            self._idle.clear()
+
+
+class CircuitBreaker:
+    """
+    Fail-fast guard for requests to an unresponsive daemon or component.
+
+    After :data:`FAILURES` consecutive timeouts the breaker opens and requests are
+    refused without touching the network. Once the backoff has elapsed, a single
+    probe is let through; a timeout re-opens the breaker with twice the backoff,
+    up to :data:`MAX_BACKOFF`, while a reply closes it again.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.backoff = BACKOFF
+        self.retry_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.failures < FAILURES:
+                return True
+            now = time.monotonic()
+            if now < self.retry_at:
+                return False
+            # half-open: hold off other requests until the probe is back
+            self.retry_at = now + self.backoff
+            self.probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.backoff = BACKOFF
+            self.probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            # requests sent before the breaker opened do not extend the backoff
+            if self.failures == FAILURES or self.probing:
+                self.probing = False
+                self.retry_at = time.monotonic() + self.backoff
+                self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+
+class ReadCache:
+    """
+    Read-through cache of replies to read-only requests, with single-flight
+    coalescing: while a request for a key is in flight, identical requests wait
+    for its reply instead of being sent again. Successful replies are reused for
+    ``ttl`` seconds, or until the key is invalidated by a write; writes do so
+    both before they are sent and once they return.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: dict[tuple, tuple[float, Reply]] = {}
+        self._flights: dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, func: Callable[[], Reply]) -> Reply:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Future()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            return flight.result()
+        try:
+            ret = func()
+        except BaseException as e:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.set_exception(e)
+            raise
+        with self._lock:
+            # replies to flights overtaken by a write are not cached
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+                if ret.success:
+                    self._entries[key] = (time.monotonic(), ret)
+        flight.set_result(ret)
+        return ret
+
+    def invalidate(self, port: int, name: str | None = None):
+        """Drop all keys of ``port``, or only those of component ``name``."""
+        with self._lock:
+            for keys in (self._entries, self._flights):
+                for key in list(keys):
+                    if key[1] == port and (name is None or key[2:] == (name,)):
+                        del keys[key]
+
+
+class JobCache:
+    """
+    Jobs of the queue of a tomato daemon. Finished jobs no longer change, so
+    only jobs which are new or were unfinished are requested again.
+    """
+
+    def __init__(self):
+        self.done: dict[int, Job] = {}
+        self.pending: list[int] = []
+        self.top = 0
+        self.lock = threading.Lock()
+
+    def where(self) -> str:
+        with self.lock:
+            where = f"id > {self.top}"
+            if self.pending:
+                where += f" OR id IN ({', '.join(map(str, self.pending))})"
+        return where
+
+    def update(self, jobs: list[Job]) -> list[Job]:
+        """Merge the ``jobs`` received and return all jobs, sorted by id."""
+        with self.lock:
+            pending = {}
+            for job in jobs:
+                self.top = max(self.top, job.id)
+                if job.status in FINISHED and job.completed_at is not None:
+                    self.done[job.id] = job
+                elif job.id not in self.done:
+                    pending[job.id] = job
+            self.pending = sorted(pending)
+            merged = {**pending, **self.done}
+        return [merged[k] for k in sorted(merged)]
+
+
+pool = SocketPool(CTXT)
+reads = ReadCache(TTL)
+_cmps: dict[int, dict[str, tuple[Component, Driver]]] = {}
+_breakers: dict[tuple[int, str | None], CircuitBreaker] = {}
+_jobs: dict[int, JobCache] = {}
+_lock = threading.Lock()
+
+
+def _after_fork():
+    """Replace the ZMQ context, sockets and locks inherited from the parent process."""
+    global CTXT, pool, reads, _lock, _units
+    CTXT = zmq.Context()
+    kwargs.update(context=CTXT)
+    pool = SocketPool(CTXT)
+    reads = ReadCache(TTL)
+    _breakers.clear()
+    _jobs.clear()
+    _lock = threading.Lock()
+    _units = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def breaker(port: int, name: str | None = None) -> CircuitBreaker:
+    """Return the circuit breaker of a component, or of the daemon if ``name=None``."""
+    with _lock:
+        return _breakers.setdefault((port, name), CircuitBreaker())
+
+
+def _open(port: int, name: str | None, op: str) -> Reply:
+    metrics.daemon_rejected.inc(port=port, component=name or "", op=op)
+    what = "tomato" if name is None else f"component {name!r}"
+    return Reply(success=False, msg=f"{what} on port {port} is not responding")
+
+
+def _index(port: int, daemon: Daemon):
+    """Rebuild the lookup of the components on ``port`` to their drivers."""
+    _cmps[port] = {
+        name: (cmp, daemon.drvs[cmp.driver])
+        for name, cmp in daemon.cmps.items()
+        if cmp.driver in daemon.drvs
+    }
+
+
+def _tomato_status(port: int, timeout: int) -> Reply:
+    guard = breaker(port)
+    if not guard.allow():
+        return _open(port, None, "status")
+    rep = pool.request(port, dict(cmd="status", sender=f"{__name__}.status"), timeout)
+    if rep is None:
+        guard.failure()
+        return Reply(success=False, msg=f"tomato not running on port {port}")
+    guard.success()
+    _index(port, rep.data)
+    return Reply(success=True, msg=f"tomato running on port {port}", data=rep.data)
+
+
+def tomato_status(*, port: int, stgrp: str = "tomato", timeout: int = TOUT) -> Reply:
+    """
+    Get status of the tomato daemon, as :func:`tomato.tomato.status` with
+    ``yaml=True``. Also refreshes the lookup of components to their drivers.
+    """
+    ret = reads.get(("tomato", port), lambda: _tomato_status(port, timeout))
+    if not ret.success or stgrp == "tomato":
+        return ret
+    return Reply(success=True, msg=ret.msg, data=getattr(ret.data, STGRPS[stgrp]))
+
+
+def _get_jobs(port: int, where: str, timeout: int) -> Reply:
+    guard = breaker(port)
+    if not guard.allow():
+        return _open(port, None, "get_jobs")
+    rep = pool.request(port, dict(cmd="get_jobs", where=where), timeout)
+    if rep is None:
+        guard.failure()
+        return Reply(success=False, msg=f"tomato not running on port {port}")
+    guard.success()
+    return rep
+
+
+def _all_jobs(port: int, timeout: int) -> Reply:
+    with _lock:
+        cache = _jobs.setdefault(port, JobCache())
+    ret = _get_jobs(port, cache.where(), timeout)
+    if not ret.success:
+        return ret
+    jobs = cache.update(ret.data)
+    return Reply(success=True, msg=f"found {len(jobs)} jobs", data=jobs)
+
+
+def get_jobs(*, port: int, jobids: list[int] | None = None, timeout: int = TOUT):
+    """
+    Get the jobs with the given ``jobids`` from the queue of tomato, or all jobs
+    if ``jobids=None``, as :func:`tomato.ketchup.status`.
+    """
+    if jobids is None:
+        return reads.get(("jobs", port, None), lambda: _all_jobs(port, timeout))
+    where = f"id IN ({', '.join(str(int(jobid)) for jobid in jobids)})"
+    return reads.get(("jobs", port, where), lambda: _get_jobs(port, where, timeout))
+
+
+def _component(port: int, name: str) -> tuple[Component, Driver] | Reply:
+    if name not in _cmps.get(port, {}):
+        ret = tomato_status(port=port)
+        if not ret.success:
+            return ret
+        # the reply may come from the read cache, without a rebuilt lookup
+        _index(port, ret.data)
+    cmps = _cmps.get(port, {})
+    if name not in cmps:
+        return Reply(success=False, msg=f"component {name!r} not found on tomato")
+    cmp, drv = cmps[name]
+    if drv.port is None:
+        return Reply(success=False, msg=f"driver {drv.name!r} has no registered port")
+    return cmp, drv
+
+
+def _request(
+    port: int, name: str, drv: Driver, msg: dict, timeout: int, retries: int
+) -> Reply:
+    guard = breaker(port, name)
+    if not guard.allow():
+        return _open(port, name, msg["cmd"])
+    labels = dict(port=port, component=name, op=msg["cmd"])
+    rep = pool.request(drv.port, msg, timeout, retries, labels)
+    if rep is None:
+        guard.failure()
+        # the driver may have been respawned on another port
+        _cmps.get(port, {}).pop(name, None)
+        return Reply(success=False, msg="ZMQ timeout reached")
+    guard.success()
+    return rep
+
+
+def _cmp_request(
+    port: int,
+    name: str,
+    cmd: str,
+    timeout: int = DRIVER_TOUT,
+    retries: int = RETRIES,
+    **params,
+) -> Reply:
+    ret = _component(port, name)
+    if isinstance(ret, Reply):
+        return ret
+    cmp, drv = ret
+    params.update(channel=cmp.channel, address=cmp.address)
+    return _request(port, name, drv, dict(cmd=cmd, params=params), timeout, retries)
+
+
+def status(*, port: int, name: str, timeout: int = DRIVER_TOUT) -> Reply:
+    return reads.get(
+        ("status", port, name),
+        lambda: _cmp_request(port, name, "cmp_status", timeout),
+    )
+
+
+def _attrs(port: int, name: str, timeout: int) -> Reply:
+    ret = _component(port, name)
+    if isinstance(ret, Reply):
+        return ret
+    cmd = "attrs" if ret[1].version == "1.0" else "cmp_attrs"
+    return _cmp_request(port, name, cmd, timeout)
+
+
+def attrs(*, port: int, name: str, timeout: int = DRIVER_TOUT) -> Reply:
+    return reads.get(("attrs", port, name), lambda: _attrs(port, name, timeout))
+
+
+def get_attrs(
+    *, port: int, name: str, attrs: list[str], timeout: int = DRIVER_TOUT
+) -> Reply:
+    """
+    Get the values of ``attrs`` of a component. The driver protocol has no batch
+    command, so each attribute is one ``cmp_get_attr`` request.
+    """
+    data = {}
+    for attr in attrs:
+        ret = _cmp_request(port, name, "cmp_get_attr", timeout, attr=attr)
+        if not ret.success:
+            return ret
+        data[attr] = ret.data
+    return Reply(
+        success=True,
+        msg=f"attrs {list(data.keys())} of component {name!r} retrieved",
+        data=data,
+    )
+
+
+def set_attr(
+    *,
+    port: int,
+    name: str,
+    attr: str,
+    val: Any,
+    force: bool = False,
+    timeout: int = DRIVER_TOUT,
+) -> Reply:
+    if not force:
+        ret = _cmp_request(port, name, "cmp_status", timeout)
+        if not ret.success:
+            return Reply(
+                success=False,
+                msg="will not 'set_attr' on a component with invalid status",
+            )
+        if ret.data["running"]:
+            return Reply(
+                success=False,
+                msg=f"will not 'set_attr' on a running component {name!r}",
+            )
+    reads.invalidate(port, name)
+    ret = _cmp_request(
+        port, name, "cmp_set_attr", timeout, retries=0, attr=attr, val=val
+    )
+    # reads sent during the write may have cached replies from before it
+    reads.invalidate(port, name)
+    return ret
+
+
+def _cmp_request_v2(
+    port: int, name: str, cmd: str, timeout: int, retries: int = RETRIES
+) -> Reply:
+    ret = _component(port, name)
+    if isinstance(ret, Reply):
+        return ret
+    if ret[1].version == "1.0":
+        return Reply(
+            success=False,
+            msg=f"driver of component {name!r} is on version {ret[1].version}",
+        )
+    return _cmp_request(port, name, cmd, timeout, retries)
+
+
+def get_last_data(*, port: int, name: str, timeout: int = DRIVER_TOUT) -> Reply:
+    return _cmp_request_v2(port, name, "cmp_last_data", timeout)
+
+
+def measure(*, port: int, name: str, timeout: int = DRIVER_TOUT) -> Reply:
+    return _cmp_request_v2(port, name, "cmp_measure", timeout, retries=0)
+
+
+def _tomato(func: Callable[..., Reply], port: int, **params) -> Reply:
+    reads.invalidate(port)
+    t0 = time.perf_counter()
+    ret = func(**kwargs, port=port, **params)
+    reads.invalidate(port)
+    labels = dict(port=port, component="", op=func.__name__)
+    metrics.daemon_seconds.observe(time.perf_counter() - t0, **labels)
+    return ret
+
+
+def pipeline_load(*, port: int, pipeline: str, sampleid: str) -> Reply:
+    return _tomato(tomato.pipeline_load, port, pipeline=pipeline, sampleid=sampleid)
+
+
+def pipeline_eject(*, port: int, pipeline: str) -> Reply:
+    return _tomato(tomato.pipeline_eject, port, pipeline=pipeline)
+
+
+def pipeline_ready(*, port: int, pipeline: str) -> Reply:
+    return _tomato(tomato.pipeline_ready, port, pipeline=pipeline)
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def window(x: np.ndarray, x0: float, x1: float) -> slice:
+    """
+    Return the slice of the sorted ``x`` falling within ``[x0, x1]``, extended by
+    one point on each side so that lines reach the edges of the plot.
+    """
+    i0 = np.searchsorted(x, x0, side="left")
+    i1 = np.searchsorted(x, x1, side="right")
+    return slice(max(i0 - 1, 0), min(i1 + 1, x.size))
+
+
+def minmax(x: np.ndarray, y: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Return the sorted indices of the points of a trace to keep when plotting it
+    at a resolution of ``buckets`` equal-width bins in ``x``.
+
+    For numeric ``y``, the minimum and maximum of each bin are kept, so that no
+    peaks are lost, as well as the first and last valid point. Non-numeric ``y``
+    are sampled at regular intervals instead.
+    """
+    n = x.size
+    if n <= 2 * buckets:
+        return np.arange(n)
+    if y.dtype.kind not in "biuf":
+        return np.unique(np.linspace(0, n - 1, 2 * buckets).astype(int))
+
+    valid = np.flatnonzero(np.isfinite(y))
+    if valid.size <= 2 * buckets:
+        return valid
+    xv = x[valid]
+    yv = y[valid]
+    edges = np.linspace(xv[0], xv[-1], buckets + 1)
+    starts = np.unique(np.searchsorted(xv, edges[:-1], side="left"))
+    seg = np.repeat(np.arange(starts.size), np.diff(np.r_[starts, xv.size]))
+
+    keep = [[0, valid.size - 1]]
+    for ufunc in (np.minimum, np.maximum):
+        hits = np.flatnonzero(ufunc.reduceat(yv, starts)[seg] == yv)
+        keep.append(hits[np.r_[True, seg[hits][1:] != seg[hits][:-1]]])
+    return valid[np.unique(np.concatenate(keep))]
+
+
+def relayout_xrange(relayout: dict | None, previous: list | None) -> list | None:
+    """Return the x-range of a plot after ``relayout``, or ``None`` if autoranged."""
+    if relayout is None:
+        return previous
+    elif relayout.get("xaxis.autorange"):
+        return None
+    elif "xaxis.range[0]" in relayout:
+        return [relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]]
+    elif "xaxis.range" in relayout:
+        return list(relayout["xaxis.range"])
+    return previous
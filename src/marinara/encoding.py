@@ -0,0 +1,31 @@
+import base64
+import numpy as np
+
+# numpy dtypes with a plotly.js typed-array counterpart
+DTYPES = {
+    np.dtype("float64"): "f8",
+    np.dtype("float32"): "f4",
+    np.dtype("int32"): "i4",
+    np.dtype("uint32"): "u4",
+    np.dtype("int16"): "i2",
+    np.dtype("uint16"): "u2",
+    np.dtype("int8"): "i1",
+    np.dtype("uint8"): "u1",
+}
+
+
+def typed_array(arr: np.ndarray) -> dict | np.ndarray:
+    """
+    Encode a numeric ``arr`` as a base64 plotly.js typed-array spec, i.e. a
+    :class:`dict` with ``dtype`` and ``bdata``, bypassing Python lists and JSON
+    numbers. Arrays which cannot be encoded are returned unchanged.
+    """
+    arr = np.asarray(arr)
+    if arr.dtype.kind == "b":
+        arr = arr.astype(np.uint8)
+    elif arr.dtype.kind in "iu" and arr.dtype not in DTYPES:
+        arr = arr.astype(np.float64)
+    if arr.dtype not in DTYPES:
+        return arr
+    buf = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<"))
+    return {"dtype": DTYPES[arr.dtype], "bdata": base64.b64encode(buf).decode()}
@@ -0,0 +1,164 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+import h5netcdf
+import numpy as np
+import xarray as xr
+from marinara.downsample import minmax
+
+CHUNK = int(os.environ.get("MARINARA_JOB_CHUNK", 1_000_000))
+FILES = 8
+
+
+class _Handle:
+    """An open group, with the number of requests reading it."""
+
+    def __init__(self, ds: xr.Dataset):
+        self.ds = ds
+        self.users = 0
+        self.evicted = False
+
+
+_files: OrderedDict[tuple, _Handle] = OrderedDict()
+_lock = threading.Lock()
+
+
+def groups(path: str) -> list[str]:
+    """Return the groups of a job output file, i.e. the roles of its components."""
+    with h5netcdf.File(path, "r") as f:
+        return list(f.groups)
+
+
+def _open(path: str, group: str) -> xr.Dataset:
+    with h5netcdf.File(path, "r") as f:
+        strings = [
+            k
+            for k, v in f[group].variables.items()
+            if v.dtype is str or v.dtype.kind in "OSU"
+        ]
+    return xr.open_dataset(
+        path,
+        group=group,
+        engine="h5netcdf",
+        drop_variables=strings,
+        create_default_indexes=False,
+        cache=False,
+    )
+
+
+def _evict(key: tuple) -> list[_Handle]:
+    handle = _files.pop(key)
+    handle.evicted = True
+    return [handle] if handle.users == 0 else []
+
+
+@contextmanager
+def open_group(path: str, group: str) -> Iterator[xr.Dataset]:
+    """
+    Open the ``group`` of a job output file lazily: no variable is read until
+    indexed, and then only the indexed points. Variables of strings, which
+    xarray would decode eagerly, are dropped. The most recently used
+    :data:`FILES` groups are kept open, and reopened if the file changes; a
+    group dropped from them is closed once no request reads it anymore.
+    """
+    key = (path, group, os.path.getmtime(path))
+    closing = []
+    with _lock:
+        handle = _files.get(key)
+        if handle is not None:
+            _files.move_to_end(key)
+            handle.users += 1
+    if handle is None:
+        ds = _open(path, group)
+        with _lock:
+            handle = _files.get(key)
+            if handle is None:
+                handle = _files[key] = _Handle(ds)
+                for old in [k for k in _files if k[:2] == key[:2] and k != key]:
+                    closing += _evict(old)
+                while len(_files) > FILES:
+                    closing += _evict(next(iter(_files)))
+            else:
+                closing.append(_Handle(ds))
+            handle.users += 1
+    for old in closing:
+        old.ds.close()
+    try:
+        yield handle.ds
+    finally:
+        with _lock:
+            handle.users -= 1
+            done = handle.evicted and handle.users == 0
+        if done:
+            handle.ds.close()
+
+
+def search(x: xr.Variable, value: float, side: str = "left") -> int:
+    """
+    Return the insertion index of ``value`` into the sorted, lazily read ``x``,
+    bisecting on single points down to a block of at most :data:`CHUNK` points.
+    """
+    lo, hi = 0, x.shape[0]
+    while hi - lo > CHUNK:
+        mid = (lo + hi) // 2
+        v = x[mid].values.item()
+        if v < value or (side == "right" and v == value):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo + int(np.searchsorted(x[lo:hi].values, value, side=side))
+
+
+def variables(ds: xr.Dataset) -> list[str]:
+    """Return the numeric time-series of a job output group."""
+    return [
+        k
+        for k, v in ds.data_vars.items()
+        if v.dims == ("uts",) and v.dtype.kind in "biuf"
+    ]
+
+
+def read_window(
+    path: str,
+    group: str,
+    keys: list[str] | None,
+    x0: float | None,
+    x1: float | None,
+    buckets: int,
+) -> tuple[list[str], list[dict]]:
+    """
+    Return the numeric variables of ``group`` and the traces of ``keys`` within
+    ``[x0, x1]``, downsampled to ``buckets`` bins. The window is read in blocks of
+    :data:`CHUNK` points, each downsampled before the next one is read, so that
+    at most one block per variable is in memory at a time.
+    """
+    with open_group(path, group) as ds:
+        dvars = variables(ds)
+        keys = dvars if not keys else [k for k in keys if k in dvars]
+        uts = ds["uts"].variable
+        n = uts.shape[0]
+        if n == 0:
+            return dvars, []
+        i0 = 0 if x0 is None else max(search(uts, x0, "left") - 1, 0)
+        i1 = n if x1 is None else min(search(uts, x1, "right") + 1, n)
+        first = uts[i0].values.item()
+        span = uts[i1 - 1].values.item() - first if i1 > i0 else 0.0
+
+        parts = {key: [] for key in keys}
+        for start in range(i0, i1, CHUNK):
+            stop = min(start + CHUNK, i1)
+            x = uts[start:stop].values
+            share = (x[-1] - x[0]) / span if span > 0 else 1.0
+            nb = max(1, round(buckets * share))
+            for key in keys:
+                y = ds[key].variable[start:stop].values
+                idx = minmax(x, y, nb)
+                parts[key].append((x[idx], y[idx]))
+    traces = []
+    for key in keys:
+        x = np.concatenate([part[0] for part in parts[key]])
+        y = np.concatenate([part[1] for part in parts[key]])
+        traces.append({"name": key, "x": x, "y": y})
+    return dvars, traces
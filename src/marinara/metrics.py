@@ -0,0 +1,176 @@
+import bisect
+import os
+import threading
+import time
+from flask import Blueprint, Response, g, request
+
+LATENCY = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+bp = Blueprint("marinara-metrics", __name__)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter, in the Prometheus text format."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[k] for k in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_labels(self.labels, key)} {val}"
+            for key, val in values.items()
+        ]
+
+
+class Histogram(Counter):
+    """Histogram of observations with fixed ``buckets``, in the Prometheus format."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: tuple = (), buckets=LATENCY):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[k] for k in self.labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        lines = []
+        for key, counts in values.items():
+            total = 0
+            for le, count in zip((*self.buckets, "+Inf"), counts[:-1]):
+                total += count
+                extra = f'le="{le}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labels, key, extra)} {total}"
+                )
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {counts[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {total}")
+        return lines
+
+
+_registry: list[Counter] = []
+
+DAEMON = ("port", "component", "op")
+daemon_seconds = Histogram(
+    "marinara_daemon_request_seconds",
+    "Latency of replies of tomato and drivers.",
+    DAEMON,
+)
+daemon_bytes = Histogram(
+    "marinara_daemon_reply_bytes",
+    "Size of replies of tomato and drivers.",
+    DAEMON,
+    SIZE,
+)
+daemon_timeouts = Counter(
+    "marinara_daemon_timeouts_total",
+    "Requests to tomato and drivers timed out.",
+    DAEMON,
+)
+daemon_rejected = Counter(
+    "marinara_daemon_rejected_total", "Requests refused by an open breaker.", DAEMON
+)
+callback_seconds = Histogram(
+    "marinara_callback_seconds", "Latency of Dash callbacks.", ("callback",)
+)
+callback_bytes = Histogram(
+    "marinara_callback_response_bytes",
+    "Size of responses of Dash callbacks.",
+    ("callback",),
+    SIZE,
+)
+callback_errors = Counter(
+    "marinara_callback_errors_total", "Dash callbacks failing.", ("callback",)
+)
+stream_refused = Counter(
+    "marinara_stream_refused_total", "Event streams refused for lack of a slot."
+)
+
+
+def _after_fork():
+    """Replace the locks of the metrics inherited from the parent process."""
+    for metric in _registry:
+        metric._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def expose() -> str:
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.doc}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+@bp.route("/metrics")
+def metrics():
+    return Response(expose(), mimetype="text/plain; version=0.0.4")
+
+
+def callback_name(app) -> str:
+    """Return the name of the function of the Dash callback being requested."""
+    body = request.get_json(silent=True) or {}
+    output = body.get("output", "")
+    func = app.callback_map.get(output, {}).get("callback")
+    return getattr(func, "__name__", output)
+
+
+def instrument(app):
+    """Register the ``/metrics`` route and time the callbacks of the Dash ``app``."""
+    app.server.register_blueprint(bp)
+
+    @app.server.before_request
+    def _start():
+        if request.path.endswith("/_dash-update-component"):
+            g.marinara_t0 = time.perf_counter()
+
+    @app.server.after_request
+    def _stop(response):
+        t0 = g.pop("marinara_t0", None)
+        if t0 is None:
+            return response
+        name = callback_name(app)
+        callback_seconds.observe(time.perf_counter() - t0, callback=name)
+        if not response.is_streamed:
+            callback_bytes.observe(response.content_length or 0, callback=name)
+        if response.status_code >= 500:
+            callback_errors.inc(callback=name)
+        return response
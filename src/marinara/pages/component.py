@@ -1,25 +1,50 @@
 import dash
-from dash import html, dcc, callback, Input, State, Output
-from tomato import passata, tomato
-import zmq
-import json
-import xarray as xr
-import plotly.express as px
-
-CTXT = zmq.Context()
-TOUT = 1000
-kwargs = dict(timeout=TOUT, context=CTXT)
+import uuid
+from dash import html, dcc, callback, clientside_callback, ctx, set_props
+from dash import ClientsideFunction, Input, State, Output
+from marinara import client
+from marinara.poller import get_snapshot, stale_note, wake
+from marinara.buffer import get_buffer
+from marinara.stream import stream_url
+from marinara.downsample import minmax, relayout_xrange, window
+from marinara.encoding import typed_array
+from marinara.scheduler import subscribe, unsubscribe
+from marinara.background import background
+
+BUCKETS = 1000
 dash.register_page(__name__, path_template="/components/<port>/<name>")
 
 
 @callback(
+    Output("component-measure-status", "children"),
     Input("component-measure-button", "n_clicks"),
-    Input("component-automeasure-interval", "n_intervals"),
     State("tomato-port-store", "data"),
     State("component-name-store", "data"),
+    prevent_initial_call=True,
+    **background(
+        running=[
+            (Output("component-measure-button", "disabled"), True, False),
+            (Output("component-measure-cancel", "disabled"), False, True),
+        ],
+        cancel=[Input("component-measure-cancel", "n_clicks")],
+    ),
 )
-def component_measure(n_clicks, n_intervals, port, name):
-    passata.measure(port=port, name=name, **kwargs)
+def component_measure(n_clicks, port, name):
+    set_props("component-measure-status", {"children": "measuring ..."})
+    ret = client.measure(port=port, name=name)
+    return ret.msg
+
+
+# The measurement may have been triggered in a background process
+@callback(
+    Input("component-measure-status", "children"),
+    State("tomato-port-store", "data"),
+    State("component-name-store", "data"),
+    prevent_initial_call=True,
+)
+def component_measure_done(_, port, name):
+    client.reads.invalidate(port, name)
+    wake(port, name)
 
 
 @callback(
@@ -27,32 +52,41 @@ def component_measure(n_clicks, n_intervals, port, name):
     State("tomato-port-store", "data"),
     State("component-name-store", "data"),
     Input("component-interval", "n_intervals"),
+    Input("component-events-store", "data"),
 )
-def component_running(port, name, n_intervals):
-    ret = passata.status(**kwargs, port=port, name=name)
-    if ret.success:
+def component_running(port, name, n_intervals, n_events):
+    snapshot = get_snapshot(port, name)
+    if snapshot is None:
+        return f"no reply from {name}"
+    ret = snapshot["status"]
+    if ret.success and snapshot["stale"] is not None:
+        return f"{ret.data['running']} ({stale_note(snapshot)})"
+    elif ret.success:
         return str(ret.data["running"])
     else:
         return ret.msg
 
 
+# Auto measure is scheduled on the server, shared by all sessions; the interval
+# renews the subscription of this session.
 @callback(
-    Output("component-automeasure-interval", "interval"),
-    Input("component-automeasure-delay", "value"),
-)
-def component_automeasure_delay(value):
-    return value * 1000
-
-
-@callback(
-    Output("component-automeasure-interval", "disabled"),
+    Output("component-automeasure-status", "children"),
     Input("component-automeasure-button", "value"),
+    Input("component-automeasure-delay", "value"),
+    Input("component-interval", "n_intervals"),
+    State("component-session-store", "data"),
+    State("tomato-port-store", "data"),
+    State("component-name-store", "data"),
 )
-def component_automeasure_toggle(value):
+def component_automeasure(value, delay, n_intervals, session, port, name):
     if value is None or len(value) == 0:
-        return True
+        unsubscribe(port, name, session)
+        return ""
+    if ctx.triggered_id == "component-interval" or delay is None or delay <= 0:
+        schedule = subscribe(port, name, session)
     else:
-        return False
+        schedule = subscribe(port, name, session, float(delay))
+    return f"every {schedule.period:g} s, {len(schedule.sessions)} session(s)"
 
 
 @callback(
@@ -60,70 +94,104 @@ def component_automeasure_toggle(value):
     State("tomato-port-store", "data"),
     State("component-name-store", "data"),
     Input("component-interval", "n_intervals"),
+    Input("component-events-store", "data"),
 )
-def component_attrs(port, name, n_intervals):
-    ret = passata.attrs(**kwargs, port=port, name=name)
-    if ret.success:
-        attrs = []
-        for k, v in ret.data.items():
-            val = passata.get_attrs(**kwargs, port=port, name=name, attrs=[k])
-            attrs.append(
-                html.Tr(
-                    children=[html.Td(k), html.Td(str(val.data[k])), html.Td(str(v))]
-                )
-            )
-        return attrs
+def component_attrs(port, name, n_intervals, n_events):
+    snapshot = get_snapshot(port, name)
+    if snapshot is None:
+        return dash.no_update
+    ret = snapshot["attrs"]
+    if not ret.success:
+        return ret.msg
+    vals = snapshot["avals"]
+    attrs = [] if vals.success else [html.Tr(html.Td(vals.msg, colSpan=3))]
+    for k, v in ret.data.items():
+        val = str(vals.data[k]) if vals.success and k in vals.data else ""
+        attrs.append(html.Tr(children=[html.Td(k), html.Td(val), html.Td(str(v))]))
+    return attrs
 
 
 @callback(
+    Output("component-data-graph", "figure"),
+    Output("component-data-graph", "extendData"),
     Output("component-data-store", "data"),
+    Input("component-data-dropdown", "value"),
+    Input("component-data-graph", "relayoutData"),
+    Input("component-interval", "n_intervals"),
+    Input("component-events-store", "data"),
+    State("component-data-store", "data"),
     State("tomato-port-store", "data"),
     State("component-name-store", "data"),
-    State("component-data-store", "data"),
-    Input("component-interval", "n_intervals"),
 )
-def component_data_update(port, name, data, n_intervals):
-    ret = passata.get_last_data(**kwargs, port=port, name=name)
-    if not ret.success:
-        return None
-    if data is None:
-        ndata = ret.data
+def component_data(keys, relayout, n_intervals, n_events, cursor, port, name):
+    buffer = get_buffer(port, name)
+    if cursor is None:
+        cursor = {"cursor": 0, "keys": None, "range": None, "extended": 0}
+    if ctx.triggered_id == "component-data-graph":
+        xrange = relayout_xrange(relayout, cursor["range"])
+        if xrange == cursor["range"]:
+            return dash.no_update, dash.no_update, dash.no_update
+        cursor.update(cursor=0, range=xrange)
+    elif ctx.triggered_id == "component-data-dropdown":
+        cursor.update(cursor=0)
+    elif cursor["cursor"] < buffer.oldest() or cursor["extended"] > BUCKETS:
+        cursor.update(cursor=0)
+    total, data = buffer.since(cursor["cursor"])
+    if total == cursor["cursor"]:
+        return dash.no_update, dash.no_update, dash.no_update
+    dvars = [k for k in data.keys() if k != "uts"]
+    if keys is None or len(keys) == 0:
+        keys = dvars
     else:
-        odata = xr.Dataset.from_dict(data)
-        ndata = xr.merge([odata, ret.data])
-    return ndata.to_dict()
+        keys = [k for k in keys if k in dvars]
+    new = {
+        "cursor": total,
+        "keys": keys,
+        "vars": dvars,
+        "range": cursor["range"],
+        "extended": 0,
+    }
+
+    if cursor["cursor"] > 0 and cursor["keys"] == keys:
+        new["extended"] = cursor["extended"] + data["uts"].size
+        update = {
+            "x": [data["uts"] for key in keys],
+            "y": [data[key] for key in keys],
+        }
+        extend = [update, list(range(len(keys))), buffer.capacity]
+        return dash.no_update, extend, new
+
+    if cursor["range"] is None:
+        sel = slice(None)
+    else:
+        sel = window(data["uts"], *cursor["range"])
+    x = data["uts"][sel]
+    traces = []
+    for key in keys:
+        y = data[key][sel]
+        idx = minmax(x, y, BUCKETS)
+        traces.append({"x": typed_array(x[idx]), "y": typed_array(y[idx]), "name": key})
+    return {"data": traces, "layout": {"uirevision": True}}, dash.no_update, new
 
 
 @callback(
     Output("component-data-dropdown", "options"),
     Input("component-data-store", "data"),
+    State("component-data-dropdown", "options"),
 )
-def component_data_dropdown(data: dict | None):
-    if data is None:
-        return []
-    return list(data["data_vars"].keys())
+def component_data_dropdown(cursor, options):
+    if cursor is None or cursor["vars"] == options:
+        return dash.no_update
+    return cursor["vars"]
 
 
-@callback(
-    Output("component-data-graph", "figure"),
-    Input("component-data-dropdown", "value"),
-    Input("component-data-store", "data"),
+clientside_callback(
+    ClientsideFunction("marinara", "subscribe"),
+    Output("component-events-store", "data"),
+    Input("component-stream-store", "data"),
+    State("component-events-store", "id"),
+    State("component-interval", "id"),
 )
-def component_data(keys, ds):
-    if ds is None:
-        return None
-    if keys is None or len(keys) == 0:
-        keys = list(ds["data_vars"].keys())
-    data = []
-    for key in keys:
-        data.append(
-            {
-                "x": ds["coords"]["uts"]["data"],
-                "y": ds["data_vars"][key]["data"],
-                "name": key,
-            }
-        )
-    return {"data": data, "layout": {"uirevision": True}}
 
 
 def layout(port: int, name: str, **_):
@@ -134,10 +202,13 @@ def layout(port: int, name: str, **_):
             dcc.Store(id="tomato-port-store", data=port),
             dcc.Store(id="component-name-store", data=name),
             dcc.Store(id="component-data-store", data=None),
-            dcc.Interval(id="component-interval", interval=2000),
-            dcc.Interval(
-                id="component-automeasure-interval", interval=2000, disabled=True
+            dcc.Store(
+                id="component-stream-store",
+                data=dash.get_relative_path(stream_url(port, [name])),
             ),
+            dcc.Store(id="component-events-store", data=0),
+            dcc.Store(id="component-session-store", data=str(uuid.uuid4())),
+            dcc.Interval(id="component-interval", interval=10000),
         ]
     )
     content = html.Table(
@@ -175,6 +246,8 @@ def layout(port: int, name: str, **_):
     footer = html.Div(
         [
             html.Button("Measure", id="component-measure-button"),
+            html.Button("Cancel", id="component-measure-cancel", disabled=True),
+            html.Div(id="component-measure-status", className="inline"),
             html.Div(
                 [
                     "Measurement Frequency:",
@@ -189,39 +262,10 @@ def layout(port: int, name: str, **_):
                         id="component-automeasure-button",
                         inline=True,
                     ),
+                    html.Div(id="component-automeasure-status"),
                 ]
             ),
         ]
     )
 
     return [header, content, footer]
-
-
-if False:
-    rows = []
-    ret = passata.status(**kwargs, port=port, name=name)
-    if ret.success:
-        rows.append(
-            html.Tr(children=[html.Td("Running:"), html.Td(str(ret.data["running"]))])
-        )
-    ret = passata.attrs(**kwargs, port=port, name=name)
-    if ret.success:
-        attrs = []
-        for k, v in ret.data.items():
-            val = passata.get_attrs(**kwargs, port=port, name=name, attrs=[k])
-
-            attrs.append(
-                html.Tr(
-                    children=[html.Td(k), html.Td(str(val.data[k])), html.Td(str(v))]
-                )
-            )
-        rows.append(html.Tr(children=[html.Td("Attrs:"), html.Td(children=attrs)]))
-    ret = passata.get_last_data(**kwargs, port=port, name=name)
-    if ret.success:
-        rows.append(html.Tr(children=[html.Td("Data:"), str(ret.data)]))
-    else:
-        rows.append(html.Tr(children=[html.Td("Data:"), ret.msg]))
-
-    content = html.Table(children=rows)
-
-    # body = html.Div(ret)
@@ -0,0 +1,106 @@
+import dash
+import os
+from dash import html, dcc, callback, clientside_callback, ctx
+from dash import ClientsideFunction, Input, State, Output
+from marinara import client
+from marinara.downsample import relayout_xrange
+from marinara.encoding import typed_array
+
+BUCKETS = 1000
+dash.register_page(__name__, path_template="/jobs/<port>/<jobid>")
+
+
+@callback(
+    Output("job-info-div", "children"),
+    Output("job-path-store", "data"),
+    Output("job-group-dropdown", "options"),
+    Output("job-group-dropdown", "value"),
+    Input("job-port-store", "data"),
+    Input("job-id-store", "data"),
+)
+def job_info(port, jobid):
+    ret = client.get_jobs(port=port, jobids=[jobid])
+    if not ret.success:
+        return ret.msg, None, [], None
+    elif len(ret.data) == 0:
+        return f"found no job with jobid {jobid}", None, [], None
+    job = ret.data[0]
+    path = job.respath if job.status in client.FINISHED else job.snappath
+    info = f"Job {job.id} ({job.jobname}), status {job.status!r}: "
+    if path is None or not os.path.exists(path):
+        return info + "no output file yet", None, [], None
+    # jobdata loads h5netcdf and h5py, only needed once a job is opened
+    from marinara import jobdata
+
+    roles = jobdata.groups(path)
+    return info + path, path, roles, roles[0] if roles else None
+
+
+# Only the visible window is read from the file, at the resolution of the graph.
+@callback(
+    Output("job-data-graph", "figure"),
+    Output("job-data-dropdown", "options"),
+    Output("job-range-store", "data"),
+    Input("job-path-store", "data"),
+    Input("job-group-dropdown", "value"),
+    Input("job-data-dropdown", "value"),
+    Input("job-data-graph", "relayoutData"),
+    Input("job-width-store", "data"),
+    State("job-range-store", "data"),
+)
+def job_data(path, group, keys, relayout, width, xrange):
+    if path is None or group is None:
+        return {}, [], None
+    if ctx.triggered_id == "job-data-graph":
+        new = relayout_xrange(relayout, xrange)
+        if new == xrange:
+            return dash.no_update, dash.no_update, dash.no_update
+        xrange = new
+    elif ctx.triggered_id in {"job-path-store", "job-group-dropdown"}:
+        xrange = None
+    from marinara import jobdata
+
+    x0, x1 = (None, None) if xrange is None else xrange
+    dvars, data = jobdata.read_window(path, group, keys, x0, x1, width or BUCKETS)
+    traces = [
+        {"x": typed_array(t["x"]), "y": typed_array(t["y"]), "name": t["name"]}
+        for t in data
+    ]
+    figure = {"data": traces, "layout": {"uirevision": f"{path}/{group}"}}
+    return figure, dvars, xrange
+
+
+clientside_callback(
+    ClientsideFunction("marinara", "width"),
+    Output("job-width-store", "data"),
+    Input("job-data-graph", "id"),
+)
+
+
+def layout(port: int, jobid: int, **_):
+    port = int(port)
+    jobid = int(jobid)
+    header = html.Div(
+        children=[
+            html.Div(f"The user requested job {jobid=} on {port=}"),
+            html.Div(id="job-info-div"),
+            dcc.Store(id="job-port-store", data=port),
+            dcc.Store(id="job-id-store", data=jobid),
+            dcc.Store(id="job-path-store", data=None),
+            dcc.Store(id="job-range-store", data=None),
+            dcc.Store(id="job-width-store", data=None),
+        ]
+    )
+    content = html.Div(
+        children=[
+            dcc.Dropdown(id="job-group-dropdown", clearable=False),
+            dcc.Dropdown(
+                id="job-data-dropdown",
+                multi=True,
+                clearable=True,
+                placeholder="all data_vars",
+            ),
+            dcc.Graph(id="job-data-graph"),
+        ]
+    )
+    return [header, content]
@@ -1,15 +1,15 @@
 import dash
-from dash import html, dcc, callback, set_props, Input, Output, State, MATCH
-from tomato import passata, tomato
-from zmq import Context
+from dash import html, dcc, callback, clientside_callback, set_props
+from dash import ClientsideFunction, Input, Output, State, MATCH
 import logging
 import pint
+from marinara import client
+from marinara.poller import get_snapshot, get_snapshots, stale_note, wake
+from marinara.stream import stream_url
+from marinara.background import background
 
 logger = logging.getLogger(__name__)
 
-CTXT = Context()
-TOUT = 1000
-kwargs = dict(timeout=TOUT, context=CTXT)
 
 
 def get_data_fields(pname, dname):
@@ -56,7 +56,11 @@ def create_header_div(port: int, name: str):
             dcc.Store(id="store-pipeline-component-attrs-units", data=None),
             dcc.Store(id="store-pipeline-component-attrs-rw", data=None),
             dcc.Store(id="store-pipeline-component-data", data=None),
-            dcc.Interval(id="interval-pipeline-content", interval=2000),
+            dcc.Store(id="store-pipeline-stale", data=None),
+            dcc.Store(id="store-pipeline-stream", data=None),
+            dcc.Store(id="store-pipeline-events", data=0),
+            dcc.Store(id="store-pipeline-visible", data=None),
+            dcc.Interval(id="interval-pipeline-content", interval=10000),
         ],
         className="header-store",
     )
@@ -99,15 +103,34 @@ def object_from_attrs(cname, attr, params, value):
     return obj
 
 
-# Create content div once, populate stores
+def reply_note(ret, what: str) -> str:
+    """Return the reason ``what`` could not be shown, from a failed reply."""
+    return f"{what}: no reply" if ret is None else f"{what}: {ret.msg}"
+
+
+# Create content div once, populate stores; retried on the interval until tomato
+# replies
 @callback(
     Output("content-wrapper", "children"),
     Input("store-tomato-port", "data"),
     Input("store-pipeline-name", "data"),
+    Input("interval-pipeline-content", "n_intervals"),
+    State("store-pipeline-component-names", "data"),
 )
-def create_content_div(port, name):
-    pip = tomato.status(**kwargs, port=port, stgrp="pipelines").data[name]
-
+def create_content_div(port, name, _, cmps):
+    if cmps is not None:
+        return dash.no_update
+    snapshot = get_snapshot(port)
+    ret = None if snapshot is None else snapshot["status"]
+    if ret is None or not ret.success:
+        return html.Div(reply_note(ret, f"tomato on port {port}"), className="block")
+    daemon = ret.data
+    if name not in daemon.pips:
+        return html.Div(f"pipeline {name!r} not found on tomato", className="block")
+    pip = daemon.pips[name]
+    snapshots = get_snapshots(port, pip.components)
+
+    stale_store = {"": stale_note(snapshot)}
     set_props(
         "store-pipeline-params",
         {
@@ -138,6 +161,8 @@ def create_content_div(port, name):
                 value=str(pip.sampleid) if pip.sampleid is not None else "",
                 debounce=True,
             ),
+            html.Button("Cancel", id="pipeline-sampleid-cancel", disabled=True),
+            html.Div(id="pipeline-sampleid-status", className="inline"),
         ],
         className="block",
     )
@@ -159,13 +184,29 @@ def create_content_div(port, name):
         className="block",
     )
 
+    stale = html.Div(
+        stale_note(snapshot),
+        id={"type": "stale", "index": ""},
+        className="block stale",
+    )
+
     running_store = {}
     attrs_vals_store = {}
     attrs_units_store = {}
     attrs_rw_store = {}
     components = []
     for cname in pip.components:
-        cmp = tomato.status(**kwargs, port=port, stgrp="components").data[cname]
+        cmp = daemon.cmps.get(cname)
+        snapshot = snapshots[cname]
+        if cmp is None:
+            components.append(
+                html.Div(
+                    id=f"component-{cname}",
+                    children=[html.Div(f"component {cname!r} not found on tomato")],
+                    className="component block",
+                )
+            )
+            continue
         div_info = html.Div(
             children=[
                 html.Div(f"name: {cmp.name}"),
@@ -174,8 +215,19 @@ def create_content_div(port, name):
             ],
             className="block",
         )
+        if snapshot is None:
+            components.append(
+                html.Div(
+                    id=f"component-{cname}",
+                    children=[div_info, html.Div("no reply", className="block")],
+                    className="component",
+                )
+            )
+            continue
 
-        status = passata.status(**kwargs, port=port, name=cname).data
+        status = snapshot["status"]
+        if status.success:
+            running_store[cname] = status.data["running"]
         div_status = html.Div(
             children=[
                 html.Div(
@@ -183,29 +235,37 @@ def create_content_div(port, name):
                     className="inline",
                 ),
                 html.Div(
-                    f"{status['running']}",
+                    f"{status.data['running']}" if status.success else status.msg,
                     id={
                         "type": "component-params",
                         "index": f"{cname}",
                     },
                     className="inline",
-                )
+                ),
+                html.Div(
+                    stale_note(snapshot),
+                    id={"type": "stale", "index": f"{cname}"},
+                    className="inline stale",
+                ),
             ],
             className="block",
         )
-        running_store[cname] = status["running"]
-
-        attrs = passata.attrs(**kwargs, port=port, name=cname).data
-        avals = passata.get_attrs(
-            **kwargs, port=port, name=cname, attrs=attrs.keys()
-        ).data
-        attrs_vals_store[cname] = {
-            k: v.m if attrs[k].units is not None else v for k, v in avals.items()
-        }
-        attrs_units_store[cname] = {k: attrs[k].units for k in attrs.keys()}
-        attrs_rw_store[cname] = {k: attrs[k].rw for k in attrs.keys()}
-
-        div_attrs_ch = []
+        stale_store[cname] = stale_note(snapshot)
+
+        attrs = snapshot["attrs"]
+        avals = snapshot["avals"]
+        if not attrs.success or not avals.success:
+            ret = attrs if not attrs.success else avals
+            attrs, avals = {}, {}
+            div_attrs_ch = [html.Div(reply_note(ret, "attrs"), className="stale")]
+        else:
+            attrs, avals = attrs.data, avals.data
+            attrs_vals_store[cname] = {
+                k: v.m if attrs[k].units is not None else v for k, v in avals.items()
+            }
+            attrs_units_store[cname] = {k: attrs[k].units for k in attrs.keys()}
+            attrs_rw_store[cname] = {k: attrs[k].rw for k in attrs.keys()}
+            div_attrs_ch = []
         for attr, params in attrs.items():
             value = avals[attr].m if params.units is not None else avals[attr]
             units = (
@@ -235,15 +295,11 @@ def create_content_div(port, name):
             className="component-attrs block",
         )
 
-        data = passata.get_last_data(**kwargs, port=port, name=cname).data
+        latest = snapshot["latest"]
         div_data_ch = []
         for key in get_data_fields(name, cmp.driver):
-            if data is None or key not in data:
-                value = None
-                units = ""
-            else:
-                value = data[key].values[-1]
-                units = data[key].attrs.get("units", "")
+            value = latest.get(key)
+            units = snapshot["units"].get(key, "") if key in latest else ""
             div_data_ch.append(
                 html.Div(
                     children=[
@@ -273,14 +329,20 @@ def create_content_div(port, name):
             )
         )
     set_props("store-pipeline-component-names", {"data": pip.components})
+    set_props(
+        "store-pipeline-stream",
+        {"data": dash.get_relative_path(stream_url(port, [None]))},
+    )
     set_props("store-pipeline-component-running", {"data": running_store})
     set_props("store-pipeline-component-attrs-vals", {"data": attrs_vals_store})
     set_props("store-pipeline-component-attrs-units", {"data": attrs_units_store})
     set_props("store-pipeline-component-attrs-rw", {"data": attrs_rw_store})
+    set_props("store-pipeline-stale", {"data": stale_store})
 
     children = [
         html.Div(
-            children=[ready, jobid, sampleid], className="pipeline-params-wrapper"
+            children=[stale, ready, jobid, sampleid],
+            className="pipeline-params-wrapper",
         ),
         html.Div(children=components, className="pipeline-components-wrapper"),
     ]
@@ -300,7 +362,8 @@ def create_content_div(port, name):
 def component_attr_interaction(value, id, disabled, arw, port, name):
     cname, attr = id["index"].split("/")
     if arw[cname][attr] and not disabled:
-        ret = passata.set_attr(**kwargs, port=port, name=cname, attr=attr, val=value)
+        ret = client.set_attr(port=port, name=cname, attr=attr, val=value)
+        wake(port, cname)
         if ret.success:
             return dash.no_update
         else:
@@ -322,124 +385,169 @@ def pipeline_param_interaction_ready(values, data, port, name):
         return dash.no_update
 
     if len(values) > 0 and all(values):
-        tomato.pipeline_ready(**kwargs, port=port, pipeline=name)
+        client.pipeline_ready(port=port, pipeline=name)
+        wake(port)
     return ["ready"]
 
 
 @callback(
+    Output("pipeline-sampleid-status", "children"),
     Input("pipeline-input-sampleid", "value"),
     State("store-tomato-port", "data"),
     State("store-pipeline-name", "data"),
     prevent_initial_call=True,
+    **background(
+        running=[
+            (Output("pipeline-input-sampleid", "disabled"), True, False),
+            (Output("pipeline-sampleid-cancel", "disabled"), False, True),
+        ],
+        cancel=[Input("pipeline-sampleid-cancel", "n_clicks")],
+    ),
 )
 def pipeline_param_interaction_sampleid(sampleid, port, name):
     if sampleid == "":
-        tomato.pipeline_eject(**kwargs, port=port, pipeline=name)
+        set_props("pipeline-sampleid-status", {"children": "ejecting ..."})
+        ret = client.pipeline_eject(port=port, pipeline=name)
     else:
-        tomato.pipeline_load(**kwargs, port=port, pipeline=name, sampleid=sampleid)
+        set_props("pipeline-sampleid-status", {"children": "loading ..."})
+        ret = client.pipeline_load(port=port, pipeline=name, sampleid=sampleid)
+    return "" if ret.success else ret.msg
 
 
-# Background store update using passata / tomato
+# The write may have been done in a background process
 @callback(
-    Output("store-pipeline-component-attrs-vals", "data"),
-    Input("interval-pipeline-content", "n_intervals"),
-    State("store-pipeline-component-names", "data"),
-    State("store-pipeline-component-attrs-vals", "data"),
-    State("store-pipeline-component-attrs-units", "data"),
+    Input("pipeline-sampleid-status", "children"),
     State("store-tomato-port", "data"),
-    State("store-pipeline-name", "data"),
     prevent_initial_call=True,
 )
-def components_periodic_update_attrs_vals_store(_, cmps, avals, aunits, port, name):
-    newdata = {}
-    for cmp in cmps:
-        newdata[cmp] = {}
-        nvals = passata.get_attrs(
-            **kwargs, port=port, name=cmp, attrs=avals[cmp].keys()
-        ).data
-        for key in avals[cmp].keys():
-            if aunits[cmp][key] is not None:
-                val = nvals[key].to(aunits[cmp][key]).m
-            else:
-                val = nvals[key]
-            newdata[cmp][key] = val
-    if newdata == avals:
+def pipeline_param_interaction_done(_, port):
+    client.reads.invalidate(port)
+    wake(port)
+
+
+def diff_store(old: dict | None, new: dict):
+    """
+    Return a :class:`dash.Patch` containing only the top-level keys of ``new``
+    which differ from ``old``, or :data:`dash.no_update` if nothing changed.
+    """
+    if old is None:
+        return new
+    elif old == new:
         return dash.no_update
-    else:
-        return newdata
-
-
-@callback(
-    Output("store-pipeline-component-data", "data"),
-    Input("interval-pipeline-content", "n_intervals"),
+    patch = dash.Patch()
+    for key, val in new.items():
+        if key not in old or old[key] != val:
+            patch[key] = val
+    for key in old.keys() - new.keys():
+        del patch[key]
+    return patch
+
+
+# Push updates of the stores whenever the snapshots of the visible components
+# change, pausing while the page is hidden
+clientside_callback(
+    ClientsideFunction("marinara", "watch"),
+    Output("store-pipeline-events", "data"),
+    Input("store-pipeline-stream", "data"),
     State("store-pipeline-component-names", "data"),
-    State("store-pipeline-component-data", "data"),
-    State("store-tomato-port", "data"),
-    State("store-pipeline-name", "data"),
+    State("store-pipeline-events", "id"),
+    State("store-pipeline-visible", "id"),
+    State("interval-pipeline-content", "id"),
     prevent_initial_call=True,
 )
-def components_periodic_update_data_store(_, cmps, data, port, name):
-    newdata = {}
-    for cmp in cmps:
-        newdata[cmp] = {}
-        ds = passata.get_last_data(**kwargs, port=port, name=cmp).data
-        if ds is None:
-            continue
-        dd = ds.to_dict()
-        for k, v in dd["coords"].items():
-            newdata[cmp][k] = v["data"][-1]
-        for k, v in dd["data_vars"].items():
-            newdata[cmp][k] = v["data"][-1]
-    if newdata == {}:
-        return dash.no_update
-    elif newdata == data:
-        return dash.no_update
-    else:
-        return newdata
 
 
+# Background store update using a single snapshot of the pipeline
 @callback(
+    Output("store-pipeline-params", "data"),
     Output("store-pipeline-component-running", "data"),
+    Output("store-pipeline-component-attrs-vals", "data"),
+    Output("store-pipeline-component-data", "data"),
+    Output("store-pipeline-stale", "data"),
     Input("interval-pipeline-content", "n_intervals"),
+    Input("store-pipeline-events", "data"),
     State("store-pipeline-component-names", "data"),
+    State("store-pipeline-params", "data"),
     State("store-pipeline-component-running", "data"),
+    State("store-pipeline-component-attrs-vals", "data"),
+    State("store-pipeline-component-attrs-units", "data"),
+    State("store-pipeline-component-data", "data"),
+    State("store-pipeline-stale", "data"),
+    State("store-pipeline-visible", "data"),
     State("store-tomato-port", "data"),
+    State("store-pipeline-name", "data"),
     prevent_initial_call=True,
 )
-def components_periodic_update_params_store(_, cmps, params, port):
-    newparams = {}
-    for cname in cmps:
-        ret = passata.status(**kwargs, port=port, name=cname).data
-        newparams[cname] = ret["running"]
-    if newparams == params:
-        return dash.no_update
+def pipeline_periodic_update_stores(
+    _, __, cmps, params, running, avals, aunits, data, stale, visible, port, name
+):
+    if cmps is None:
+        return (dash.no_update,) * 5
+    snapshot = get_snapshot(port)
+    newstale = {"": stale_note(snapshot)}
+    if snapshot is None or not snapshot["status"].success:
+        newparams = params
+    elif name not in snapshot["status"].data.pips:
+        newparams = params
     else:
-        return newparams
+        pip = snapshot["status"].data.pips[name]
+        newparams = {
+            "jobid": pip.jobid,
+            "sampleid": str(pip.sampleid) if pip.sampleid is not None else "",
+            "ready": ["ready"] if pip.ready else [],
+        }
 
+    newrunning = {}
+    newavals = {}
+    newdata = {}
+    snapshots = get_snapshots(
+        port, [cmp for cmp in cmps if visible is None or cmp in visible]
+    )
+    for cmp in cmps:
+        snapshot = snapshots.get(cmp)
+        if snapshot is None:
+            newstale[cmp] = (stale or {}).get(cmp, "")
+            if cmp in running:
+                newrunning[cmp] = running[cmp]
+            if cmp in avals:
+                newavals[cmp] = avals[cmp]
+            newdata[cmp] = (data or {}).get(cmp, {})
+            continue
 
-@callback(
-    Output("store-pipeline-params", "data"),
-    Input("interval-pipeline-content", "n_intervals"),
-    State("store-pipeline-params", "data"),
-    State("store-tomato-port", "data"),
-    State("store-pipeline-name", "data"),
-    prevent_initial_call=True,
-)
-def pipeline_periodic_update_params_store(_, data, port, name):
-    pip = tomato.status(**kwargs, port=port, stgrp="pipelines").data[name]
-    newdata = {
-        "jobid": pip.jobid,
-        "sampleid": str(pip.sampleid) if pip.sampleid is not None else "",
-        "ready": ["ready"] if pip.ready else [],
-    }
-    if newdata == data:
-        return dash.no_update
-    else:
-        return newdata
+        newstale[cmp] = stale_note(snapshot)
+        if snapshot["status"].success:
+            newrunning[cmp] = snapshot["status"].data["running"]
+        elif cmp in running:
+            newrunning[cmp] = running[cmp]
+
+        if cmp in avals and snapshot["avals"].success:
+            nvals = snapshot["avals"].data
+            newavals[cmp] = {}
+            for key in avals[cmp].keys():
+                if key not in nvals:
+                    val = avals[cmp][key]
+                elif aunits[cmp][key] is not None:
+                    val = nvals[key].to(aunits[cmp][key]).m
+                else:
+                    val = nvals[key]
+                newavals[cmp][key] = val
+        elif cmp in avals:
+            newavals[cmp] = avals[cmp]
+
+        newdata[cmp] = snapshot["latest"]
+
+    return (
+        diff_store(params, newparams),
+        diff_store(running, newrunning),
+        diff_store(avals, newavals),
+        diff_store(data, newdata),
+        diff_store(stale, newstale),
+    )
 
 
 # UI update if background stores have been changed
-@callback(
+clientside_callback(
+    ClientsideFunction("marinara", "components_update_attr_display"),
     Output(
         {"type": "component-attr-val", "index": MATCH},
         "value",
@@ -450,31 +558,15 @@ def pipeline_periodic_update_params_store(_, data, port, name):
     State({"type": "component-attr-val", "index": MATCH}, "id"),
     prevent_initial_call=True,
 )
-def components_update_attr_display(avals, value, id):
-    cname, key = id["index"].split("/")
-    newval = avals[cname][key]
-    if isinstance(newval, float):
-        newval = round(newval, 3)
-    if newval == value:
-        return dash.no_update
-    else:
-        return newval
 
-@callback(
+clientside_callback(
+    ClientsideFunction("marinara", "components_disable_attr_running"),
     Output({"type": "component-attr-val", "index": MATCH}, "disabled"),
     Input("store-pipeline-component-running", "data"),
     State({"type": "component-attr-val", "index": MATCH}, "id"),
     State("store-pipeline-component-attrs-rw", "data"),
     prevent_initial_call=True,
 )
-def components_disable_attr_running(running, id, rw):
-    print(f"{id=}")
-    cname, key = id["index"].split("/")
-    print(f"{running=} {key=} {rw[cname][key]=}")
-    if running[cname]:
-        return True
-    else:
-        return not rw[cname][key]
 
 
 @callback(
@@ -498,7 +590,8 @@ def pipeline_update_param_display(data, ready, sampleid, jobid):
     return data["ready"], data["sampleid"], data["jobid"]
 
 
-@callback(
+clientside_callback(
+    ClientsideFunction("marinara", "components_update_param_display"),
     Output(
         {"type": "component-params", "index": MATCH},
         "children",
@@ -509,13 +602,9 @@ def pipeline_update_param_display(data, ready, sampleid, jobid):
     State({"type": "component-params", "index": MATCH}, "id"),
     prevent_initial_call=True,
 )
-def components_update_param_display(data, value, id):
-    if value == str(data[id["index"]]):
-        return dash.no_update
-    else:
-        return str(data[id["index"]])
 
-@callback(
+clientside_callback(
+    ClientsideFunction("marinara", "components_update_data_display"),
     Output(
         {"type": "component-data-val", "index": MATCH},
         "value",
@@ -526,18 +615,15 @@ def components_update_param_display(data, value, id):
     State({"type": "component-data-val", "index": MATCH}, "id"),
     prevent_initial_call=True,
 )
-def components_update_data_display(data, value, id):
-    cname, key = id["index"].split("/")
-    if data is None or key not in data[cname]:
-        return dash.no_update
-    elif value == data[cname][key]:
-        return dash.no_update
-    else:
-        val = data[cname][key]
-        if isinstance(val, float):
-            val = round(val, 3)
-        return val
 
+clientside_callback(
+    ClientsideFunction("marinara", "update_stale_display"),
+    Output({"type": "stale", "index": MATCH}, "children"),
+    Input("store-pipeline-stale", "data"),
+    State({"type": "stale", "index": MATCH}, "children"),
+    State({"type": "stale", "index": MATCH}, "id"),
+    prevent_initial_call=True,
+)
 
 
 dash.register_page(__name__, path_template="/pipelines/<port>/<name>")
@@ -1,13 +1,34 @@
 import dash
-from dash import html, dcc, callback, Output, Input, State
-from tomato import passata, tomato
-import zmq
-import json
+from dash import html, dcc, dash_table, callback, set_props, Output, Input, State
+from tomato.models import Reply
+from marinara import client
+from marinara.poller import get_snapshot, refresh, stale_note
+from marinara.table import PAGE_SIZE, cell, query
 
-CTXT = zmq.Context()
-TOUT = 1000
 PORT = 1234
-kwargs = dict(timeout=TOUT, context=CTXT)
+
+TABLES = {
+    "pipelines": (
+        ["Name", "Ready", "Job ID", "Sample ID"],
+        ["name", "ready", "jobid", "sampleid"],
+    ),
+    "drivers": (
+        ["Name", "Version", "Port", "Process ID"],
+        ["name", "version", "port", "pid"],
+    ),
+    "devices": (
+        ["Name", "Driver", "Address", "Channels"],
+        ["name", "driver", "address", "channels"],
+    ),
+    "components": (
+        ["Name", "Driver", "Address", "Channel", "Role", "Capabs"],
+        ["name", "driver", "address", "channel", "role", "capabilities"],
+    ),
+    "jobs": (
+        ["ID", "Name", "Status", "Submitted", "Completed"],
+        ["id", "jobname", "status", "submitted_at", "completed_at"],
+    ),
+}
 
 dash.register_page(__name__, path_template="/")
 
@@ -22,6 +43,7 @@ header = html.Header(
             id="tomato-port-setter",
         ),
         html.Button("Reload", id="tomato-status"),
+        html.Div(id="tomato-stale", className="inline stale"),
         dcc.Store(id="tomato-port", data=PORT),
     ],
 )
@@ -40,7 +62,26 @@ content = html.Div(
             id="tomato-stgrp-tab",
             value="pipelines",
         ),
-        html.Div(id="tomato-stgrp", children=["Default text."]),
+        html.Div(
+            id="tomato-stgrp",
+            className="stgrp",
+            children=[
+                html.Div(id="tomato-stgrp-msg"),
+                dash_table.DataTable(
+                    id="tomato-table",
+                    page_action="custom",
+                    page_current=0,
+                    page_size=PAGE_SIZE,
+                    sort_action="custom",
+                    sort_mode="multi",
+                    sort_by=[],
+                    filter_action="custom",
+                    filter_query="",
+                    markdown_options={"link_target": "_blank"},
+                    style_cell={"textAlign": "left"},
+                ),
+            ],
+        ),
         dcc.Store(id="store-tomato-status"),
     ],
 )
@@ -57,73 +98,64 @@ def store_tomato_port(value):
     State("tomato-port", "data"),
 )
 def store_tomato_status(n_clicks, port):
-    ret = tomato.status(stgrp="tomato", port=port, **kwargs)
+    snapshot = get_snapshot(port) if n_clicks is None else refresh(port)
+    set_props("tomato-stale", {"children": stale_note(snapshot)})
+    if snapshot is None:
+        return f"no reply from tomato on port {port}"
+    return snapshot["status"].msg
+
+
+@callback(
+    Output("tomato-table", "columns"),
+    Output("tomato-table", "page_current"),
+    Output("tomato-table", "sort_by"),
+    Output("tomato-table", "filter_query"),
+    Input("tomato-stgrp-tab", "value"),
+)
+def reset_tomato_table(stgrp):
+    headers, attrs = TABLES[stgrp]
+    columns = [dict(name=h, id=a) for h, a in zip(headers, attrs)]
+    columns[0]["presentation"] = "markdown"
+    return columns, 0, [], ""
+
+
+def get_objs(port: int, stgrp: str) -> Reply:
+    if stgrp == "jobs":
+        return client.get_jobs(port=port)
+    snapshot = get_snapshot(port)
+    if snapshot is None:
+        return Reply(success=False, msg=f"no reply from tomato on port {port}")
+    ret = snapshot["status"]
     if not ret.success:
-        return ret.msg
-    else:
-        return ret.data.model_dump_json()
+        return ret
+    objs = getattr(ret.data, client.STGRPS[stgrp]).values()
+    return Reply(success=True, msg=ret.msg, data=objs)
 
 
+# Only the requested page of the filtered and sorted rows is sent to the browser.
 @callback(
-    Output("tomato-stgrp", "children"),
+    Output("tomato-table", "data"),
+    Output("tomato-table", "page_count"),
+    Output("tomato-stgrp-msg", "children"),
     Input("store-tomato-status", "data"),
     Input("tomato-stgrp-tab", "value"),
+    Input("tomato-table", "page_current"),
+    Input("tomato-table", "page_size"),
+    Input("tomato-table", "sort_by"),
+    Input("tomato-table", "filter_query"),
     State("tomato-port", "data"),
 )
-def update_tomato_stgrp(data, stgrp, port):
-    try:
-        js = json.loads(data)
-    except json.JSONDecodeError:
-        return data
-
-    if stgrp == "pipelines":
-        return format_obj(
-            obj=js["pips"],
-            headers=["Name", "Ready", "Job ID", "Sample ID"],
-            attrs=["name", "ready", "jobid", "sampleid"],
-            otype=stgrp,
-            port=port,
-        )
-    elif stgrp == "drivers":
-        return format_obj(
-            obj=js["drvs"],
-            headers=["Name", "Version", "Port", "Process ID"],
-            attrs=["name", "version", "port", "pid"],
-            otype=stgrp,
-            port=port,
-        )
-    elif stgrp == "devices":
-        return format_obj(
-            obj=js["devs"],
-            headers=["Name", "Driver", "Address", "Channels"],
-            attrs=["name", "driver", "address", "channels"],
-            otype=stgrp,
-            port=port,
-        )
-    elif stgrp == "components":
-        return format_obj(
-            obj=js["cmps"],
-            headers=["Name", "Driver", "Address", "Channel", "Role", "Capabs"],
-            attrs=["name", "driver", "address", "channel", "role", "capabilities"],
-            otype=stgrp,
-            port=port,
-        )
-    else:
-        return data
-    # return str(value)
-
-
-def format_obj(obj, headers, attrs, otype, port):
-    rows = [html.Tr(children=[html.Th(h) for h in headers])]
-    for k, v in obj.items():
-        row = [html.Td(str(v[i])) for i in attrs]
-        row[0].children = dcc.Link(
-            row[0].children,
-            href=f"./{otype}/{port}/{row[0].children}",
-            target="_blank",
-        )
-        rows.append(html.Tr(children=row))
-    return html.Table(children=rows, className="stgrp")
+def update_tomato_table(_, stgrp, page_current, page_size, sort_by, filter_query, port):
+    ret = get_objs(port, stgrp)
+    if not ret.success:
+        return [], 1, ret.msg
+    attrs = TABLES[stgrp][1]
+    rows = [{attr: cell(getattr(obj, attr)) for attr in attrs} for obj in ret.data]
+    page, count = query(rows, filter_query, sort_by, page_current, page_size)
+    for row in page:
+        name = row[attrs[0]]
+        row[attrs[0]] = f"[{name}](./{stgrp}/{port}/{name})"
+    return page, count, ""
 
 
 def layout(**_):
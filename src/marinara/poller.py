@@ -0,0 +1,336 @@
+import threading
+import os
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from tomato.models import Reply
+from marinara import client
+from marinara.buffer import get_buffer
+from marinara.cache import attrs_cache
+
+logger = logging.getLogger(__name__)
+
+TOUT = 1000
+INTERVAL = 2.0
+FLOOR = float(os.environ.get("MARINARA_POLL_FLOOR", INTERVAL))
+CEILING = float(os.environ.get("MARINARA_POLL_CEILING", 15.0))
+SLOWDOWN = 1.5
+IDLE = 30.0
+WORKERS = 16
+DEADLINE = 2.0
+
+executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="marinara")
+changed = threading.Condition()
+
+
+class Poller(threading.Thread):
+    """
+    Background thread polling the tomato daemon on behalf of all viewers.
+
+    The latest set of replies is kept in :attr:`snapshot`; callbacks should use
+    :func:`get_snapshot` instead of talking to the daemon. A poller stops itself
+    once nobody has read its snapshot for :data:`IDLE` seconds.
+
+    Whenever the :meth:`signature` of a new snapshot differs from the previous
+    one, :attr:`version` is incremented and :data:`changed` is notified.
+
+    Failed replies are replaced by the last good ones, if any, in which case the
+    snapshot is marked as ``"stale"`` with the time of the first failure. The
+    last good replies are kept in :data:`_held`, so that they outlive a poller
+    stopped while the daemon or component was down.
+
+    The polling interval adapts to the rate of change: it is multiplied by
+    :data:`SLOWDOWN` after every unchanged snapshot, up to :data:`CEILING`, and
+    drops to :data:`FLOOR` after a change or a call to :meth:`wake`.
+    """
+
+    def __init__(self, port: int, name: str | None = None, interval: float = INTERVAL):
+        super().__init__(name=f"poller-{port}-{name}", daemon=True)
+        self.port = port
+        self.cname = name
+        self.interval = interval
+        self.snapshot = None
+        self.lock = threading.Lock()
+        self.polled = threading.Condition(self.lock)
+        self.begun = None
+        self.ready = threading.Event()
+        self.halt = threading.Event()
+        self.woken = threading.Event()
+        self.last_read = time.monotonic()
+        self.version = 0
+        self._signature = None
+
+    def poll(self) -> dict:
+        raise NotImplementedError
+
+    def signature(self, snapshot: dict):
+        return (
+            snapshot["stale"],
+            snapshot["status"].success,
+            snapshot["status"].data,
+        )
+
+    def hold(self, snapshot: dict) -> dict:
+        with _lock:
+            good = _held.setdefault((self.port, self.cname), {"stale": None})
+            held = False
+            for key, ret in snapshot.items():
+                if ret.success:
+                    good[key] = ret
+                elif key in good:
+                    snapshot[key] = good[key]
+                    held = True
+            if not held:
+                good["stale"] = None
+            elif good["stale"] is None:
+                good["stale"] = time.time()
+            snapshot["stale"] = good["stale"]
+        return snapshot
+
+    def run(self):
+        while not self.halt.is_set():
+            if time.monotonic() - self.last_read > IDLE:
+                logger.debug("stopping idle poller %r", self.name)
+                break
+            begun = time.monotonic()
+            try:
+                snapshot = self.hold(self.poll())
+            except Exception:
+                logger.exception("poller %r failed", self.name)
+            else:
+                snapshot["time"] = time.time()
+                signature = self.signature(snapshot)
+                with self.polled:
+                    self.snapshot = snapshot
+                    self.begun = begun
+                    self.polled.notify_all()
+                self.ready.set()
+                if signature != self._signature:
+                    self._signature = signature
+                    self.version += 1
+                    self.interval = FLOOR
+                    with changed:
+                        changed.notify_all()
+                else:
+                    self.interval = min(self.interval * SLOWDOWN, CEILING)
+            self.woken.wait(self.interval)
+            self.woken.clear()
+        _remove(self)
+
+    def wake(self):
+        """Poll again right away, e.g. after a write to the daemon."""
+        self.interval = FLOOR
+        self.woken.set()
+
+    def refresh(self, timeout: float | None = None) -> dict | None:
+        """
+        Poll again right away and return the snapshot of that poll, or the
+        latest one if it takes longer than ``timeout`` seconds.
+        """
+        self.touch()
+        since = time.monotonic()
+        self.wake()
+        with self.polled:
+            self.polled.wait_for(
+                lambda: self.begun is not None and self.begun >= since, timeout
+            )
+            return self.snapshot
+
+    def touch(self):
+        self.last_read = time.monotonic()
+
+    def get(self, timeout: float | None = None) -> dict | None:
+        self.touch()
+        self.ready.wait(timeout)
+        with self.lock:
+            return self.snapshot
+
+
+class DaemonPoller(Poller):
+    def poll(self):
+        return {"status": client.tomato_status(port=self.port)}
+
+
+class ComponentPoller(Poller):
+    """
+    Poller of a single component. Besides the replies, the snapshot contains the
+    ``"latest"`` value of each variable of the data, read from the end of the
+    arrays, and their ``"units"``, cached for as long as the variables remain
+    the same.
+
+    A part of the snapshot whose request is still in flight from an earlier poll
+    is not requested again, but its reply is used by the poll it arrives in, so
+    that a slow component occupies at most one worker of the :data:`executor`
+    per part; the last good reply is held meanwhile. A request raising instead
+    of replying counts as a failed reply, and is sent again by the next poll.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._names = None
+        self._units = {}
+        self._inflight: dict[str, Future] = {}
+
+    def _version(self) -> str | None:
+        snapshot = get_snapshot(self.port)
+        if snapshot is None or not snapshot["status"].success:
+            return None
+        daemon = snapshot["status"].data
+        if self.cname not in daemon.cmps:
+            return None
+        if daemon.cmps[self.cname].driver not in daemon.drvs:
+            return None
+        return daemon.drvs[daemon.cmps[self.cname].driver].version
+
+    def _attrs(self):
+        attrs = attrs_cache.get(self.port, self.cname, self._version())
+        if not attrs.success:
+            return attrs, attrs
+        # attributes with status=True are part of the reply to cmp_status, which
+        # is requested by every poll anyway and coalesced by the read cache
+        values = {}
+        if any(attr.status for attr in attrs.data.values()):
+            ret = client.status(port=self.port, name=self.cname)
+            if ret.success:
+                values = {
+                    k: ret.data[k]
+                    for k, attr in attrs.data.items()
+                    if attr.status and k in ret.data
+                }
+        avals = client.get_attrs(
+            port=self.port,
+            name=self.cname,
+            attrs=[k for k in attrs.data.keys() if k not in values],
+        )
+        if not avals.success:
+            attrs_cache.invalidate(self.port, self.cname)
+            return attrs, avals
+        values.update(avals.data)
+        data = {k: values[k] for k in attrs.data.keys()}
+        return attrs, Reply(success=True, msg=avals.msg, data=data)
+
+    def signature(self, snapshot):
+        return (
+            super().signature(snapshot),
+            snapshot["avals"].data,
+            snapshot["latest"].get("uts"),
+        )
+
+    def hold(self, snapshot):
+        previous = self.snapshot or {}
+        snapshot = super().hold(snapshot)
+        ret = snapshot["data"]
+        if ret is previous.get("data"):
+            snapshot["latest"] = previous["latest"]
+        elif ret.success and ret.data is not None:
+            variables = ret.data.variables
+            names = tuple(variables)
+            if names != self._names:
+                self._names = names
+                self._units = {k: variables[k].attrs.get("units", "") for k in names}
+            snapshot["latest"] = {k: variables[k].values[-1].item() for k in names}
+        else:
+            snapshot["latest"] = {}
+        snapshot["units"] = self._units
+        return snapshot
+
+    def _submit(self, key: str, func, **kwargs) -> Future:
+        if key not in self._inflight:
+            self._inflight[key] = executor.submit(func, **kwargs)
+        return self._inflight[key]
+
+    def poll(self):
+        futures = {
+            "status": self._submit(
+                "status", client.status, port=self.port, name=self.cname
+            ),
+            "attrs": self._submit("attrs", self._attrs),
+            "data": self._submit(
+                "data", client.get_last_data, port=self.port, name=self.cname
+            ),
+        }
+        wait(futures.values(), timeout=DEADLINE)
+        failed = Reply(success=False, msg="deadline for daemon reply exceeded")
+        snapshot = {}
+        for key, future in futures.items():
+            if not future.done():
+                snapshot[key] = (failed, failed) if key == "attrs" else failed
+                continue
+            del self._inflight[key]
+            if future.exception() is None:
+                snapshot[key] = future.result()
+                continue
+            logger.error(
+                "poller %r: %s failed", self.name, key, exc_info=future.exception()
+            )
+            error = Reply(success=False, msg=f"{key} failed: {future.exception()!r}")
+            snapshot[key] = (error, error) if key == "attrs" else error
+        snapshot["attrs"], snapshot["avals"] = snapshot["attrs"]
+        if snapshot["data"].success:
+            get_buffer(self.port, self.cname).extend(snapshot["data"].data)
+        return snapshot
+
+
+_pollers: dict[tuple[int, str], Poller] = {}
+_held: dict[tuple[int, str | None], dict] = {}
+_lock = threading.Lock()
+
+
+def _remove(poller: Poller):
+    with _lock:
+        if _pollers.get((poller.port, poller.cname)) is poller:
+            del _pollers[(poller.port, poller.cname)]
+
+
+def get_poller(port: int, name: str | None = None) -> Poller:
+    """
+    Return the running poller for a component, or for the daemon itself if
+    ``name`` is ``None``, starting one if necessary.
+    """
+    key = (int(port), name)
+    with _lock:
+        poller = _pollers.get(key)
+        if poller is None or not poller.is_alive():
+            cls = DaemonPoller if name is None else ComponentPoller
+            poller = cls(port=key[0], name=name)
+            _pollers[key] = poller
+            poller.start()
+    return poller
+
+
+def wake(port: int, name: str | None = None):
+    """Wake the poller of a component, or of the daemon, if one is running."""
+    with _lock:
+        poller = _pollers.get((int(port), name))
+    if poller is not None:
+        poller.wake()
+
+
+def refresh(port: int, name: str | None = None, timeout: float = TOUT / 1000):
+    """Return a snapshot polled after this call, see :meth:`Poller.refresh`."""
+    return get_poller(port, name).refresh(timeout=timeout)
+
+
+def get_snapshot(port: int, name: str | None = None, timeout: float = TOUT / 1000):
+    return get_poller(port, name).get(timeout=timeout)
+
+
+def stale_note(snapshot: dict | None) -> str:
+    """Return a note marking a stale ``snapshot``, or an empty string."""
+    if snapshot is None or snapshot["stale"] is None:
+        return ""
+    return f"stale since {time.strftime('%H:%M:%S', time.localtime(snapshot['stale']))}"
+
+
+def get_snapshots(port: int, names: list[str], timeout: float = TOUT / 1000):
+    """
+    Return the snapshots of several components, waiting at most ``timeout``
+    seconds for all of them together. Components without a snapshot by the
+    deadline are returned as ``None``.
+    """
+    deadline = time.monotonic() + timeout
+    pollers = {name: get_poller(port, name) for name in names}
+    return {
+        name: poller.get(timeout=max(0.0, deadline - time.monotonic()))
+        for name, poller in pollers.items()
+    }
@@ -0,0 +1,187 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+from flask import Blueprint, Response, g, request
+from marinara.background import CACHE_DIR
+from marinara.metrics import callback_name
+
+ENABLED = os.environ.get("MARINARA_PROFILE", "") not in {"", "0"}
+PROFILE_DIR = os.environ.get(
+    "MARINARA_PROFILE_DIR", os.path.join(CACHE_DIR, "profiles")
+)
+RECENT = 100
+COOKIE = "marinara_profile"
+HEADER = "X-Marinara-Profile"
+SAMPLE = 0.001
+
+bp = Blueprint("marinara-profiling", __name__)
+
+_recent: deque[dict] = deque()
+_lock = threading.Lock()
+
+
+def requested() -> bool:
+    """
+    Whether the current request should be profiled: always if ``MARINARA_PROFILE``
+    is set, otherwise if asked for by the header, the query or the cookie.
+    """
+    return (
+        ENABLED
+        or request.headers.get(HEADER, "") not in {"", "0"}
+        or request.args.get("profile", "") not in {"", "0"}
+        or request.cookies.get(COOKIE, "") not in {"", "0"}
+    )
+
+
+class Sampler:
+    """
+    Statistical profiler of the calling thread, with the interface of
+    :class:`cProfile.Profile` used here.
+
+    From Python 3.12, cProfile is built on :mod:`sys.monitoring`, which traces
+    every thread of the process: the other requests would be slowed down and
+    counted in the profile, and no second profile could be enabled meanwhile.
+    Instead, the stack of the profiled thread is sampled every :data:`SAMPLE`
+    seconds from a helper thread, so that concurrent requests are profiled
+    independently. The call counts of the saved stats are sample counts.
+    """
+
+    def __init__(self):
+        self.ident = threading.get_ident()
+        self.stats = {}
+        self.halt = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, name="marinara-sampler", daemon=True
+        )
+
+    def _sample(self, frame, dt: float):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        seen = set()
+        for i, func in enumerate(stack):
+            entry = self.stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+            if i == 0:
+                entry[2] += dt
+            if func in seen:
+                continue
+            seen.add(func)
+            entry[0] += 1
+            entry[1] += 1
+            entry[3] += dt
+            if i + 1 < len(stack):
+                edge = entry[4].setdefault(stack[i + 1], [0, 0, 0.0, 0.0])
+                edge[0] += 1
+                edge[1] += 1
+                edge[2] += dt if i == 0 else 0.0
+                edge[3] += dt
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self.halt.wait(SAMPLE):
+            frame = sys._current_frames().get(self.ident)
+            now = time.perf_counter()
+            if frame is not None:
+                self._sample(frame, now - last)
+            del frame
+            last = now
+
+    def enable(self):
+        self.thread.start()
+
+    def disable(self):
+        self.halt.set()
+        self.thread.join()
+
+    def dump_stats(self, file: str):
+        stats = {
+            func: (cc, nc, tt, ct, {k: tuple(v) for k, v in callers.items()})
+            for func, (cc, nc, tt, ct, callers) in self.stats.items()
+        }
+        with open(file, "wb") as f:
+            marshal.dump(stats, f)
+
+
+def _save(profiler: cProfile.Profile | Sampler, name: str, seconds: float):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    fn = f"{stamp}-{name}-{seconds * 1e3:.0f}ms-{threading.get_ident()}.prof"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, fn))
+    with _lock:
+        _recent.append(dict(time=stamp, callback=name, seconds=seconds, file=fn))
+        while len(_recent) > RECENT:
+            old = _recent.popleft()
+            try:
+                os.remove(os.path.join(PROFILE_DIR, old["file"]))
+            except OSError:
+                pass
+
+
+@bp.route("/_marinara/profiles")
+def profiles():
+    with _lock:
+        recent = sorted(_recent, key=lambda x: x["seconds"], reverse=True)
+    lines = [f"{'seconds':>8}  {'time':<15}  {'callback':<40}  file"]
+    for x in recent:
+        lines.append(
+            f"{x['seconds']:>8.3f}  {x['time']:<15}  {x['callback']:<40}  {x['file']}"
+        )
+    return Response("\n".join(lines) + "\n", mimetype="text/plain")
+
+
+@bp.route("/_marinara/profiles/<fn>")
+def profile(fn: str):
+    with _lock:
+        known = any(x["file"] == fn for x in _recent)
+    if not known:
+        return Response("no such profile", status=404)
+    out = io.StringIO()
+    stats = pstats.Stats(os.path.join(PROFILE_DIR, fn), stream=out)
+    stats.sort_stats(request.args.get("sort", "cumulative")).print_stats(40)
+    return Response(out.getvalue(), mimetype="text/plain")
+
+
+def instrument(app):
+    """
+    Register the ``/_marinara/profiles`` routes and profile the callbacks of the
+    Dash ``app`` when :func:`requested`. Passing ``?profile=1`` to any page sets
+    a cookie, so that the callbacks of that page are profiled until
+    ``?profile=0`` is passed.
+
+    Only the thread serving the request is profiled: by cProfile up to Python
+    3.11, where it hooks into the calling thread only, and by a :class:`Sampler`
+    from Python 3.12 on.
+    """
+    app.server.register_blueprint(bp)
+
+    @app.server.before_request
+    def _start():
+        if not request.path.endswith("/_dash-update-component") or not requested():
+            return
+        if sys.version_info >= (3, 12):
+            profiler = Sampler()
+        else:
+            profiler = cProfile.Profile()
+        profiler.enable()
+        g.marinara_profiler = (profiler, time.perf_counter())
+
+    @app.server.after_request
+    def _stop(response):
+        flag = request.args.get("profile")
+        if flag is not None:
+            response.set_cookie(COOKIE, flag, samesite="Strict")
+        started = g.pop("marinara_profiler", None)
+        if started is None:
+            return response
+        profiler, t0 = started
+        profiler.disable()
+        _save(profiler, callback_name(app), time.perf_counter() - t0)
+        return response
@@ -0,0 +1,112 @@
+import threading
+import time
+import logging
+from marinara import client
+from marinara.poller import wake
+
+logger = logging.getLogger(__name__)
+
+PERIOD = 2.0
+LEASE = 30.0
+
+
+class Schedule(threading.Thread):
+    """
+    Background thread measuring a single component every :attr:`period` seconds
+    on behalf of all sessions subscribed to it.
+
+    Measurements are due on a fixed grid of deadlines, so that the time taken by
+    each measurement does not add up; deadlines missed by a slow measurement are
+    skipped. Subscriptions are leases, which must be renewed by the sessions at
+    least every :data:`LEASE` seconds; the schedule stops once none is left.
+    """
+
+    def __init__(self, port: int, name: str, period: float = PERIOD):
+        super().__init__(name=f"schedule-{port}-{name}", daemon=True)
+        self.port = port
+        self.cname = name
+        self.period = period
+        self.sessions: dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+
+    def subscribe(self, session: str, period: float | None = None):
+        with self.lock:
+            self.sessions[session] = time.monotonic()
+        if period is not None and period != self.period:
+            self.period = period
+            self.changed.set()
+
+    def unsubscribe(self, session: str):
+        with self.lock:
+            self.sessions.pop(session, None)
+        self.changed.set()
+
+    def active(self) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            for session, renewed in list(self.sessions.items()):
+                if now - renewed > LEASE:
+                    logger.debug("lease of %r on %r expired", session, self.name)
+                    del self.sessions[session]
+            return len(self.sessions) > 0
+
+    def run(self):
+        last = due = time.monotonic()
+        while self.active():
+            if time.monotonic() >= due:
+                last = due
+                ret = client.measure(port=self.port, name=self.cname)
+                if not ret.success:
+                    logger.warning("scheduled measure failed: %s", ret.msg)
+                wake(self.port, self.cname)
+                due = last + self.period
+                now = time.monotonic()
+                if due < now:
+                    due += ((now - due) // self.period + 1) * self.period
+            if self.changed.wait(max(0.0, due - time.monotonic())):
+                # period changed or a session left
+                self.changed.clear()
+                due = last + self.period
+        _remove(self)
+
+
+_schedules: dict[tuple[int, str], Schedule] = {}
+_lock = threading.Lock()
+
+
+def _remove(schedule: Schedule):
+    with _lock:
+        if _schedules.get((schedule.port, schedule.cname)) is schedule:
+            del _schedules[(schedule.port, schedule.cname)]
+
+
+def subscribe(port: int, name: str, session: str, period: float | None = None):
+    """
+    Subscribe ``session`` to the measurements of a component, or renew its lease,
+    starting the schedule if necessary. A ``period`` reconfigures the schedule
+    for all subscribed sessions.
+    """
+    key = (int(port), name)
+    with _lock:
+        schedule = _schedules.get(key)
+        if schedule is None or not schedule.is_alive():
+            schedule = Schedule(port=key[0], name=name, period=period or PERIOD)
+            schedule.subscribe(session)
+            _schedules[key] = schedule
+            schedule.start()
+            return schedule
+    schedule.subscribe(session, period)
+    return schedule
+
+
+def unsubscribe(port: int, name: str, session: str):
+    with _lock:
+        schedule = _schedules.get((int(port), name))
+    if schedule is not None:
+        schedule.unsubscribe(session)
+
+
+def get_schedule(port: int, name: str) -> Schedule | None:
+    with _lock:
+        return _schedules.get((int(port), name))
@@ -0,0 +1,77 @@
+import os
+import threading
+from flask import Blueprint, Response, request, stream_with_context
+from urllib.parse import urlencode
+from marinara import metrics
+from marinara.poller import get_poller, changed
+
+HEARTBEAT = 10.0
+STREAMS = int(os.environ.get("MARINARA_STREAMS", 8))
+RETRY = 30
+
+_slots = threading.BoundedSemaphore(STREAMS)
+
+bp = Blueprint("marinara-stream", __name__)
+
+
+def stream_url(port: int, names: list[str | None]) -> str:
+    """
+    Return the path of the event stream for the given daemon ``port``. A ``None``
+    in ``names`` subscribes to the daemon itself, other entries to components.
+    """
+    query = [("port", port)] + [("name", name or "") for name in names]
+    return f"/_marinara/stream?{urlencode(query)}"
+
+
+def events(port: int, names: list[str | None]):
+    """
+    Yield a server-sent event each time the snapshot of any of the subscribed
+    pollers changes, and a ``ping`` event at least every :data:`HEARTBEAT` s.
+    """
+    versions = None
+    count = 0
+    while True:
+        pollers = [get_poller(port, name) for name in names]
+        for poller in pollers:
+            poller.touch()
+        current = [(id(poller), poller.version) for poller in pollers]
+        if current != versions:
+            versions = current
+            count += 1
+            yield f"data: {count}\n\n"
+        else:
+            yield "event: ping\ndata: \n\n"
+        with changed:
+            changed.wait(timeout=HEARTBEAT)
+
+
+def limit(streams: int):
+    """Allow at most ``streams`` event streams to be open at the same time."""
+    global _slots
+    _slots = threading.BoundedSemaphore(streams)
+
+
+# Every open stream holds a thread of the server, so that streams are refused
+# with 503 beyond the limit; the page then relies on its interval and retries
+# the stream after RETRY s.
+@bp.route("/_marinara/stream")
+def stream():
+    port = request.args.get("port", type=int)
+    if port is None:
+        return Response("no port specified", status=400)
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        metrics.stream_refused.inc()
+        return Response(
+            "too many event streams",
+            status=503,
+            headers={"Retry-After": str(RETRY)},
+        )
+    names = [name or None for name in request.args.getlist("name")]
+    response = Response(
+        stream_with_context(events(port, names)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(slots.release)
+    return response
@@ -0,0 +1,102 @@
+import math
+import operator
+import re
+
+PAGE_SIZE = 50
+
+OPERATORS = {
+    "ge": operator.ge,
+    ">=": operator.ge,
+    "le": operator.le,
+    "<=": operator.le,
+    "lt": operator.lt,
+    "<": operator.lt,
+    "gt": operator.gt,
+    ">": operator.gt,
+    "ne": operator.ne,
+    "!=": operator.ne,
+    "eq": operator.eq,
+    "=": operator.eq,
+    "contains": operator.contains,
+    "datestartswith": str.startswith,
+}
+PART = re.compile(r"\{(?P<col>[^}]+)\}\s+(?P<op>\S+)\s+(?P<value>.+)")
+
+
+def cell(value):
+    """Return ``value`` as the content of a cell, keeping numbers sortable."""
+    if value is None or isinstance(value, str):
+        return value
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return str(value)
+
+
+def parse(filter_query: str | None) -> list[tuple]:
+    """
+    Split the ``filter_query`` of a ``DataTable`` into ``(column, operator,
+    value, insensitive)`` terms. Terms which cannot be parsed are ignored.
+    """
+    terms = []
+    for part in (filter_query or "").split(" && "):
+        m = PART.fullmatch(part.strip())
+        if m is None:
+            continue
+        op = m["op"].lower()
+        insensitive = False
+        if op not in OPERATORS and op[:1] in {"s", "i"} and op[1:] in OPERATORS:
+            insensitive = op[0] == "i"
+            op = op[1:]
+        if op not in OPERATORS:
+            continue
+        value = m["value"].strip()
+        if len(value) > 1 and value[0] in "\"'`" and value[-1] == value[0]:
+            value = value[1:-1]
+        else:
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        terms.append((m["col"], OPERATORS[op], value, insensitive))
+    return terms
+
+
+def _match(value, op, ref, insensitive: bool) -> bool:
+    numeric = op not in {operator.contains, str.startswith}
+    if numeric and isinstance(value, (int, float)) and isinstance(ref, float):
+        return op(value, ref)
+    if value is None:
+        return False
+    value = str(value)
+    ref = f"{ref:g}" if isinstance(ref, float) else ref
+    if insensitive:
+        value, ref = value.casefold(), ref.casefold()
+    return op(value, ref)
+
+
+def _key(value):
+    return (value is None, isinstance(value, str), value)
+
+
+def query(
+    rows: list[dict],
+    filter_query: str | None = None,
+    sort_by: list[dict] | None = None,
+    page_current: int = 0,
+    page_size: int = PAGE_SIZE,
+) -> tuple[list[dict], int]:
+    """
+    Filter, sort and paginate ``rows`` as a ``DataTable`` with ``"custom"``
+    actions expects, returning the rows of ``page_current`` and the page count.
+    """
+    for col, op, ref, insensitive in parse(filter_query):
+        rows = [row for row in rows if _match(row.get(col), op, ref, insensitive)]
+    for sort in reversed(sort_by or []):
+        rows = sorted(
+            rows,
+            key=lambda row: _key(row.get(sort["column_id"])),
+            reverse=sort["direction"] == "desc",
+        )
+    page_size = page_size or PAGE_SIZE
+    start = (page_current or 0) * page_size
+    return rows[start : start + page_size], max(1, math.ceil(len(rows) / page_size))
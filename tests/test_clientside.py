@@ -0,0 +1,149 @@
+"""
+The display-sync callbacks of the pipeline page run in the browser, as ports of
+former server callbacks. Here, the ports in ``assets/clientside.js`` are run in
+node and compared with the Python originals on the same inputs.
+
+The stores reach both versions as JSON sent by the browser, so the inputs are
+parsed and serialized by node before being passed to the Python originals.
+"""
+
+import json
+import random
+import shutil
+import subprocess
+from pathlib import Path
+import pytest
+import marinara
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+
+JS = Path(marinara.__path__[0]) / "assets" / "clientside.js"
+NO_UPDATE = {"no_update": True}
+
+RUNNER = """
+const fs = require("fs");
+const noUpdate = {no_update: true};
+global.window = {dash_clientside: {no_update: noUpdate}};
+eval(fs.readFileSync(process.argv[1], "utf8"));
+const marinara = window.dash_clientside.marinara;
+const calls = JSON.parse(fs.readFileSync(0, "utf8"));
+const rets = calls.map(([fn, args]) => marinara[fn](...args));
+console.log(JSON.stringify({calls: calls, rets: rets}));
+"""
+
+
+def components_update_attr_display(avals, value, id):
+    cname, key = id["index"].split("/")
+    newval = avals[cname][key]
+    if isinstance(newval, float):
+        newval = round(newval, 3)
+    if newval == value:
+        return NO_UPDATE
+    else:
+        return newval
+
+
+def components_disable_attr_running(running, id, rw):
+    cname, key = id["index"].split("/")
+    if running[cname]:
+        return True
+    else:
+        return not rw[cname][key]
+
+
+def components_update_param_display(data, value, id):
+    if value == str(data[id["index"]]):
+        return NO_UPDATE
+    else:
+        return str(data[id["index"]])
+
+
+def components_update_data_display(data, value, id):
+    cname, key = id["index"].split("/")
+    if data is None or key not in data[cname]:
+        return NO_UPDATE
+    elif value == data[cname][key]:
+        return NO_UPDATE
+    else:
+        val = data[cname][key]
+        if isinstance(val, float):
+            val = round(val, 3)
+        return val
+
+
+def values(seed: int = 0) -> list:
+    r = random.Random(seed)
+    vals = [True, False, None, 0, 1, -1, 2**53, "", "auto", "0", [], {}]
+    vals += ["it's", 'say "hi"', "'\"", "a\\b\n\t", [1, "a", None, 0.5], {"a": [True]}]
+    vals += [0.0, -0.0, 1.0, 0.1 + 0.2, 1e-05, -3e-07, 1.5e-10, 1e16, 1e22]
+    vals += [-0.0005, 0.0625, -0.0625, 0.1875, 2.675, 1.2345, 4503599627370495.5]
+    vals += [r.randint(-(10**6), 10**6) / 16 for _ in range(100)]
+    vals += [r.uniform(-1, 1) * 10 ** r.randint(-8, 14) for _ in range(200)]
+    return vals
+
+
+def cases(fn: str) -> list:
+    vals = values()
+    id = {"index": "cmp/key"}
+    calls = []
+    for v in vals:
+        shown = [v, None, True, 1, "True", "None", str(v)]
+        if isinstance(v, float):
+            shown.append(round(v, 3))
+        for w in shown:
+            if fn == "components_update_attr_display":
+                calls.append([{"cmp": {"key": v}}, w, id])
+            elif fn == "components_update_param_display":
+                calls.append([{"cmp/key": v}, w, id])
+            elif fn == "components_update_data_display":
+                calls.append([{"cmp": {"key": v}}, w, id])
+        if fn == "components_disable_attr_running":
+            for rw in [True, False, None, v]:
+                calls.append([{"cmp": v}, id, {"cmp": {"key": rw}}])
+    if fn == "components_update_data_display":
+        calls += [[None, 1, id], [{}, 1, id], [{"cmp": {}}, 1, id]]
+    elif fn == "components_update_param_display":
+        calls += [[{}, "no reply", id]]
+    elif fn == "components_disable_attr_running":
+        calls += [[{}, id, {"cmp": {"key": True}}]]
+    return calls
+
+
+def run_js(calls: list) -> tuple[list, list]:
+    ret = subprocess.run(
+        ["node", "-e", RUNNER, str(JS)],
+        input=json.dumps(calls),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    out = json.loads(ret.stdout)
+    return [args for _, args in out["calls"]], out["rets"]
+
+
+def run_py(fn, args):
+    try:
+        return fn(*args)
+    except (KeyError, TypeError):
+        # a failing callback does not update its output
+        return NO_UPDATE
+
+
+def same(a, b) -> bool:
+    return isinstance(a, bool) == isinstance(b, bool) and a == b
+
+
+@pytest.mark.parametrize(
+    "fn",
+    [
+        components_update_attr_display,
+        components_disable_attr_running,
+        components_update_param_display,
+        components_update_data_display,
+    ],
+)
+def test_clientside_equivalent(fn):
+    calls = [[fn.__name__, args] for args in cases(fn.__name__)]
+    args, rets = run_js(calls)
+    for arg, ret in zip(args, rets):
+        assert same(ret, run_py(fn, arg)), arg
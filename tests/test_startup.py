@@ -0,0 +1,57 @@
+"""
+Cold start of marinara: fresh interpreters creating the app, including the import
+of all pages. The modules loaded are checked always, the wall time and peak RSS
+against a budget only with ``-m timing``, as they depend on the load of the
+machine.
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+import pytest
+
+TIME = 2.0
+RSS = 200.0
+REPEAT = 5
+# loaded on first use only: by the graphs, the job pages and the first reply
+LAZY = ("plotly.express", "h5netcdf", "h5py")
+
+CHILD = f"""
+import json, sys, time
+t0 = time.perf_counter()
+from marinara.app import app
+dt = time.perf_counter() - t0
+from marinara import client
+try:
+    import resource
+except ImportError:
+    rss = None
+else:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # in bytes on macOS, in KiB elsewhere
+    rss /= 1024**2 if sys.platform == "darwin" else 1024
+lazy = [m for m in {LAZY!r} if m in sys.modules]
+print(json.dumps({{"time": dt, "rss": rss, "lazy": lazy, "units": client._units_loaded}}))
+"""
+
+
+def measure() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def test_startup_lazy():
+    run = measure()
+    assert run["lazy"] == []
+    assert not run["units"]
+
+
+@pytest.mark.timing
+def test_startup_budget():
+    runs = [measure() for _ in range(REPEAT)]
+    assert statistics.median(run["time"] for run in runs) < TIME
+    if runs[0]["rss"] is not None:
+        assert max(run["rss"] for run in runs) < RSS